@@ -0,0 +1,12 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+# The stages are imported lazily by the pipeline, importing the package itself stays cheap
+from .pipeline import configure, pre_build, post_build, impact, run_stage, run_pipeline
@@ -0,0 +1,614 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import hashlib
+import tarfile
+import argparse
+import tempfile
+import statistics
+import contextlib
+import subprocess
+from pathlib import Path
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .pipeline import run_stage, import_tool_module
+except ImportError:
+    from pipeline import run_stage, import_tool_module
+
+
+
+######################################################################################################################################################
+##  Helper methods  ##################################################################################################################################
+######################################################################################################################################################
+
+
+
+# Sizes of the synthetic trees, binary and archive sizes in MB
+SCALES = {'small':  {'projects': 2, 'objects': 250,  'binary_size': 1,  'sources': 40,  'archive_files': 250,  'archive_size': 4,   'repo_files': 100,  'delete_dirs': 25,  'delete_files': 40},
+          'medium': {'projects': 4, 'objects': 1000, 'binary_size': 8,  'sources': 150, 'archive_files': 1000, 'archive_size': 32,  'repo_files': 500,  'delete_dirs': 100, 'delete_files': 40},
+          'large':  {'projects': 8, 'objects': 4000, 'binary_size': 32, 'sources': 600, 'archive_files': 4000, 'archive_size': 128, 'repo_files': 2000, 'delete_dirs': 400, 'delete_files': 40}}
+
+RESULTS_VERSION = 1
+
+# Bumped whenever the generated trees change, so that fixtures left by an older version are generated again
+FIXTURE_VERSION = 2
+
+
+
+# The fake tools only produce outputs of the expected shape, so the timings are those of the tooling and not of gcov or the formatter
+FAKE_GCOVR = '''
+import os, sys, json, glob
+
+arguments = sys.argv[1:]
+def option(name):
+    return arguments[arguments.index(name) + 1] if (name in arguments) else None
+
+if ('--version' in arguments):
+    print('gcovr 7.2')
+    sys.exit(0)
+
+if (option('--object-directory') is not None):
+    object_dir = option('--object-directory')
+    files = sorted(os.path.relpath(os.path.join(root, name), object_dir).replace(os.sep, '_') for [root, dirs, names] in os.walk(object_dir) for name in names)
+    with open(option('--json'), 'w') as file:
+        json.dump({'files': files, 'size': sum(os.path.getsize(os.path.join(root, name)) for [root, dirs, names] in os.walk(object_dir) for name in names)}, file)
+    sys.exit(0)
+
+files = []
+tracefiles = [arguments[index + 1] for [index, argument] in enumerate(arguments[:-1]) if (argument == '--add-tracefile')]
+for tracefile in sorted(set(name for pattern in tracefiles for name in glob.glob(pattern))):
+    with open(tracefile, 'r') as file:
+        files += [name for name in json.load(file)['files'] if (name.endswith('.gcno'))]
+
+if (option('--output') is not None):
+    with open(option('--output'), 'w') as file:
+        file.write('\\n'.join(files))
+    for name in files:
+        with open(option('--output').replace('.html', f'.{name}.html'), 'w') as file:
+            file.write(name)
+if (option('--json-summary') is not None):
+    with open(option('--json-summary'), 'w') as file:
+        json.dump(files, file)
+if (option('--cobertura') is not None):
+    with open(option('--cobertura'), 'w') as file:
+        file.write('<coverage/>')
+'''
+
+FAKE_CLANG_FORMAT = '''
+import sys
+
+arguments = sys.argv[1:]
+if ('--version' in arguments):
+    print('clang-format version 17.0.0 (benchmark)')
+    sys.exit(0)
+
+# Formatting strips the trailing whitespace, which is the only violation the synthetic sources contain
+returncode = 0
+files = [argument for argument in arguments if (argument.startswith('-') == False)]
+for [index, file_path] in enumerate(files):
+    if ('--verbose' in arguments):
+        print(f'Formatting [{index + 1}/{len(files)}] {file_path}', file=sys.stderr, flush=True)
+    with open(file_path, 'r') as file:
+        content = file.read()
+    formatted = '\\n'.join(line.rstrip() for line in content.split('\\n'))
+    if (formatted != content):
+        if ('--dry-run' in arguments):
+            print(f'{file_path}:1:1: error: code should be clang-formatted [-Wclang-format-violations]', file=sys.stderr)
+            returncode = 1
+        else:
+            with open(file_path, 'w') as file:
+                file.write(formatted)
+sys.exit(returncode)
+'''
+
+# Writes the counters of its objects like the gcov runtime, next to them or below GCOV_PREFIX without GCOV_PREFIX_STRIP leading components
+FAKE_TEST_BINARY = '''
+import os, sys
+
+prefix = os.environ.get('GCOV_PREFIX')
+strip = int(os.environ.get('GCOV_PREFIX_STRIP', '0'))
+for gcda_file in GCDA_FILES:
+    if (prefix):
+        gcda_file = os.path.join(prefix, *gcda_file.strip('/').split('/')[strip:])
+    os.makedirs(os.path.dirname(gcda_file), exist_ok=True)
+    with open(gcda_file, 'wb') as file:
+        file.write(bytes(512))
+
+print('[  PASSED  ] 0 tests.')
+'''
+
+
+
+def write_fake_tool(tools_dir, name, source):
+    tool_path = f'{tools_dir}/{name}'
+    # Without the site packages the interpreter starts twice as fast, the fake tools are started many times per case
+    with open(tool_path, 'w') as file:
+        file.write(f'#!{sys.executable} -S\n{source}')
+    os.chmod(tool_path, 0o755)
+
+
+
+def write_random_file(file_path, size, seed):
+    # Half random and half repeated content, so that compressed archives keep a realistic ratio
+    generator = random.Random(seed)
+    Path(os.path.dirname(file_path)).mkdir(parents=True, exist_ok=True)
+    with open(file_path, 'wb') as file:
+        remaining = size
+        while (remaining > 0):
+            chunk = min(remaining, 1024 * 1024)
+            half = chunk // 2
+            file.write(generator.randbytes(half) + bytes(chunk - half))
+            remaining -= chunk
+
+
+
+def generate_bin_tree(bin_dir, scale):
+    # Mirrors the CMake binary tree the post-build script works on: binaries per project, coverage metadata in the test project
+    projects = [f'proj{index}' for index in range(scale['projects'])]
+    for project in projects:
+        for extension in ['exe', 'dll', 'pdb']:
+            write_random_file(f'{bin_dir}/{project}/{project}.{extension}', scale['binary_size'] * 1024 * 1024, f'{project}.{extension}')
+
+    # Project sources sit at the top of the object directory, the shared sources below __/src
+    # The counters are written by the test binary, the post-build step removes the ones of the previous run before the tests
+    object_dir = Path(os.path.abspath(f'{bin_dir}/projTest/CMakeFiles/projTest.dir')).as_posix()
+    gcda_files = []
+    for index in range(scale['objects']):
+        object_path = f'{object_dir}/test_{index}.cpp' if (index % 2 == 0) else f'{object_dir}/__/src/module_{index % 16}/source_{index}.cpp'
+        Path(os.path.dirname(object_path)).mkdir(parents=True, exist_ok=True)
+        with open(f'{object_path}.gcno', 'wb') as file:
+            file.write(bytes(4096))
+        if (index % 5 != 0):
+            gcda_files.append(f'{object_path}.gcda')
+
+    write_fake_tool(f'{bin_dir}/projTest', 'projTest.exe', f'GCDA_FILES = {json.dumps(gcda_files)}\n{FAKE_TEST_BINARY}')
+
+    return projects
+
+
+
+def generate_sources(source_dir, scale):
+    # Every other file has trailing whitespace for the formatter to remove
+    if (os.path.exists(source_dir)):
+        shutil.rmtree(source_dir)
+    Path(source_dir).mkdir(parents=True, exist_ok=True)
+
+    source_files = []
+    for index in range(scale['sources']):
+        file_path = f'{source_dir}/source_{index}.cpp'
+        lines = [f'#include "source_{(index + 1) % scale["sources"]}.hpp"', '']
+        for function in range(40):
+            lines += [f'int function_{index}_{function}(int value)' + ('  ' if (index % 2 == 0) else ''), '{', f'    return value * {function};', '}', '']
+        with open(file_path, 'w') as file:
+            file.write('\n'.join(lines))
+        source_files.append(Path(file_path).as_posix())
+
+    return source_files
+
+
+
+def generate_archive(archive_path, scale):
+    content_dir = f'{archive_path}.content/resource'
+    file_size = max(1, scale['archive_size'] * 1024 * 1024 // scale['archive_files'])
+    for index in range(scale['archive_files']):
+        write_random_file(f'{content_dir}/dir_{index % 32}/file_{index}.bin', file_size, f'archive{index}')
+
+    with tarfile.open(archive_path, 'w:gz') as archive:
+        archive.add(content_dir, arcname='resource')
+    shutil.rmtree(f'{archive_path}.content')
+
+
+
+def generate_git_repo(repo_dir, scale):
+    # A bare repository with two commits, cloned over the local transport like a remote one
+    work_dir = f'{repo_dir}.work'
+    git = ['git', '-c', 'user.name=benchmark', '-c', 'user.email=benchmark@localhost']
+    subprocess.run(['git', 'init', '--quiet', work_dir], check=True)
+    for commit in range(2):
+        for index in range(scale['repo_files']):
+            with open(f'{work_dir}/file_{index}.txt', 'w') as file:
+                file.write(f'commit {commit} file {index}\n' * 64)
+        subprocess.run(git + ['-C', work_dir, 'add', '--all'], check=True)
+        subprocess.run(git + ['-C', work_dir, 'commit', '--quiet', '-m', f'commit {commit}'], check=True)
+
+    subprocess.run(['git', 'clone', '--quiet', '--bare', work_dir, repo_dir], check=True)
+    shutil.rmtree(work_dir)
+
+
+
+def generate_delete_tree(base_dir, scale):
+    for index in range(scale['delete_dirs']):
+        for file_index in range(scale['delete_files']):
+            Path(f'{base_dir}/build_{index}/obj').mkdir(parents=True, exist_ok=True)
+            with open(f'{base_dir}/build_{index}/obj/file_{file_index}.o', 'wb') as file:
+                file.write(bytes(1024))
+        with open(f'{base_dir}/build_{index}.tmp', 'w') as file:
+            file.write('temporary')
+
+
+
+def reset_path(path):
+    if (os.path.isdir(path)):
+        shutil.rmtree(path)
+    elif (os.path.exists(path)):
+        os.remove(path)
+
+
+
+class Fixture:
+    # Generated once per scale, every case only resets the outputs it writes
+    def __init__(self, work_dir, scale_name):
+        self.scale_name = scale_name
+        self.scale = SCALES[scale_name]
+        self.root = Path(os.path.abspath(f'{work_dir}/{scale_name}')).as_posix()
+        self.bin_dir = f'{self.root}/bin'
+        self.out_dir = f'{self.root}/out'
+        self.tools_dir = f'{self.root}/tools'
+        self.source_dir = f'{self.root}/sources'
+        self.archive = f'{self.root}/remote/resource.tar.gz'
+        self.repo = f'{self.root}/remote/repo.git'
+        self.log_file = f'{self.root}/benchmark.log'
+        self.projects = [f'proj{index}' for index in range(self.scale['projects'])]
+        self.source_files = None
+        self.sha256 = None
+
+    def generate(self):
+        if (os.path.isfile(f'{self.root}/fixture.json')):
+            with open(f'{self.root}/fixture.json', 'r') as file:
+                if (json.load(file) == dict(self.scale, version=FIXTURE_VERSION)):
+                    return
+
+        print(f'... generating the "{self.scale_name}" fixture in {self.root} ...')
+        reset_path(self.root)
+        Path(f'{self.root}/remote').mkdir(parents=True, exist_ok=True)
+        Path(self.tools_dir).mkdir(parents=True, exist_ok=True)
+        write_fake_tool(self.tools_dir, 'gcovr', FAKE_GCOVR)
+        write_fake_tool(self.tools_dir, 'clang-format', FAKE_CLANG_FORMAT)
+        generate_bin_tree(self.bin_dir, self.scale)
+        generate_archive(self.archive, self.scale)
+        generate_git_repo(self.repo, self.scale)
+
+        with open(f'{self.root}/fixture.json', 'w') as file:
+            json.dump(dict(self.scale, version=FIXTURE_VERSION), file)
+
+    def archive_hash(self):
+        if (self.sha256 is None):
+            with open(self.archive, 'rb') as file:
+                self.sha256 = hashlib.sha256(file.read()).hexdigest()
+        return self.sha256
+
+    def configurator(self):
+        # The configurator needs a newer Python than the other tools, its cases are skipped where it cannot be imported
+        try:
+            return import_tool_module('project_configurator')
+        except SyntaxError:
+            return None
+
+
+
+@contextlib.contextmanager
+def tool_environment(fixture):
+    # The fake tools come first on the PATH, the stage output goes to the log of the fixture
+    previous_path = os.environ.get('PATH', '')
+    os.environ['PATH'] = f'{fixture.tools_dir}{os.pathsep}{previous_path}'
+    try:
+        with open(fixture.log_file, 'a') as log_file:
+            with contextlib.redirect_stdout(log_file):
+                yield
+    finally:
+        os.environ['PATH'] = previous_path
+
+
+
+def run_checked_stage(fixture, stage_name, argv):
+    returncode = run_stage(stage_name, argv, dict())
+    if (returncode != 0):
+        raise SystemExit(f'ERROR: stage "{stage_name}" failed with code {returncode}, log available at {fixture.log_file}, leaving...')
+
+
+
+def post_build_arguments(fixture, extra):
+    return ['-m', 'gcc', '-o', fixture.out_dir, '-b', fixture.bin_dir, '-p', ','.join(fixture.projects), '-t', '', '--copy_jobs', '8'] + extra
+
+
+
+def setup_copy_full(fixture):
+    reset_path(fixture.out_dir)
+
+def run_copy_full(fixture):
+    run_checked_stage(fixture, 'post_build', post_build_arguments(fixture, ['--copy_only']))
+
+
+
+def setup_copy_incremental(fixture):
+    # Only an incremental run leaves the manifests behind, the timed runs then find nothing to copy
+    if (os.path.isdir(f'{fixture.out_dir}/{import_tool_module("post_build_tasks").MANIFEST_DIR}') == False):
+        reset_path(fixture.out_dir)
+        run_copy_incremental(fixture)
+
+def run_copy_incremental(fixture):
+    run_checked_stage(fixture, 'post_build', post_build_arguments(fixture, ['--copy_only', '-i']))
+
+
+
+def setup_coverage_cold(fixture):
+    reset_path(fixture.out_dir)
+    for directory in ['coverage_cache', 'coverage_metadata', 'test_runs']:
+        reset_path(f'{fixture.bin_dir}/projTest/{directory}')
+
+def run_coverage(fixture):
+    run_checked_stage(fixture, 'post_build', ['-m', 'gcc', '-o', fixture.out_dir, '-b', fixture.bin_dir, '-p', '', '-t', 'projTest', '-c', '--coverage_format', 'html,json'])
+
+
+
+def setup_coverage_warm(fixture):
+    if (os.path.isfile(f'{fixture.bin_dir}/projTest/coverage_cache/manifest.json') == False):
+        with tool_environment(fixture):
+            run_coverage(fixture)
+
+
+
+def setup_fetch_wget_cold(fixture):
+    for path in [f'{fixture.root}/extern/resource', f'{fixture.root}/cache']:
+        reset_path(path)
+    Path(f'{fixture.root}/extern').mkdir(parents=True, exist_ok=True)
+
+def run_fetch_wget(fixture):
+    cache = {'dir': f'{fixture.root}/cache', 'size_limit': 1024 * 1024 * 1024 * 1024, 'offline': False}
+    configurator = fixture.configurator()
+    configurator.FetchWgetResource(f'{fixture.root}/extern/', 'resource', Path(fixture.archive).as_uri(), sha256=fixture.archive_hash(), cache=cache, log=lambda line: None)
+
+
+
+def setup_fetch_wget_cached(fixture):
+    if (os.path.isdir(f'{fixture.root}/cache/objects') == False):
+        setup_fetch_wget_cold(fixture)
+        run_fetch_wget(fixture)
+    reset_path(f'{fixture.root}/extern/resource')
+
+
+
+def setup_fetch_git(fixture):
+    for path in [f'{fixture.root}/extern/repo', f'{fixture.root}/extern/repo.log']:
+        reset_path(path)
+    Path(f'{fixture.root}/extern').mkdir(parents=True, exist_ok=True)
+
+def run_fetch_git(fixture):
+    configurator = fixture.configurator()
+    configurator.FetchGitRepo(f'{fixture.root}/extern/', 'repo', Path(fixture.repo).as_uri(), None, log=lambda line: None)
+
+
+
+def setup_fetch_git_mirror(fixture):
+    setup_fetch_git(fixture)
+    if (os.path.isdir(f'{fixture.root}/git_cache') == False):
+        run_fetch_git_mirror(fixture)
+        setup_fetch_git_mirror(fixture)
+
+def run_fetch_git_mirror(fixture):
+    # The mirror is filled before the first repetition, so only its update and the worktree are timed
+    cache = {'dir': f'{fixture.root}/git_cache', 'size_limit': 1024 * 1024 * 1024 * 1024, 'offline': False}
+    configurator = fixture.configurator()
+    configurator.FetchGitRepo(f'{fixture.root}/extern/', 'repo', Path(fixture.repo).as_uri(), None, cache=cache, log=lambda line: None)
+
+
+
+def setup_remove_entries(fixture):
+    reset_path(f'{fixture.root}/delete')
+    generate_delete_tree(f'{fixture.root}/delete', fixture.scale)
+
+def run_remove_entries(fixture):
+    configurator = fixture.configurator()
+    configurator.RemoveEntries(f'{fixture.root}/delete/', ['build_*', '*.tmp'], 4)
+
+
+
+def setup_clang_format_cold(fixture):
+    fixture.source_files = generate_sources(fixture.source_dir, fixture.scale)
+    reset_path(f'{fixture.bin_dir}/clang_format_cache.json')
+
+def run_clang_format(fixture):
+    run_checked_stage(fixture, 'pre_build', ['-b', fixture.bin_dir, '-s', ','.join(fixture.source_files), '--tasks', 'clang_format'])
+
+
+
+def setup_clang_format_cached(fixture):
+    if (fixture.source_files is None) or (os.path.isfile(f'{fixture.bin_dir}/clang_format_cache.json') == False):
+        setup_clang_format_cold(fixture)
+        with tool_environment(fixture):
+            run_clang_format(fixture)
+
+
+
+# Cases run in this order, the configurator ones only where it can be imported
+CASES = {'copy_full':           [setup_copy_full,           run_copy_full,        False],
+         'copy_incremental':    [setup_copy_incremental,    run_copy_incremental, False],
+         'coverage_cold':       [setup_coverage_cold,       run_coverage,         False],
+         'coverage_warm':       [setup_coverage_warm,       run_coverage,         False],
+         'fetch_wget_cold':     [setup_fetch_wget_cold,     run_fetch_wget,       True],
+         'fetch_wget_cached':   [setup_fetch_wget_cached,   run_fetch_wget,       True],
+         'fetch_git':           [setup_fetch_git,           run_fetch_git,        True],
+         'fetch_git_mirror':    [setup_fetch_git_mirror,    run_fetch_git_mirror, True],
+         'remove_entries':      [setup_remove_entries,      run_remove_entries,   True],
+         'clang_format_cold':   [setup_clang_format_cold,   run_clang_format,     False],
+         'clang_format_cached': [setup_clang_format_cached, run_clang_format,     False]}
+
+
+
+def run_case(fixture, case_name, repeat):
+    [setup_function, run_function, needs_configurator] = CASES[case_name]
+    if (needs_configurator) and (fixture.configurator() is None):
+        return None
+
+    # Spans recorded while the case runs break its time down into the instrumented steps
+    tracing = import_tool_module('tracing')
+    timings = []
+    spans = dict()
+    for repetition in range(repeat):
+        with tool_environment(fixture):
+            setup_function(fixture)
+            tracing.TRACER = tracing.Tracer(os.devnull)
+            start = time.perf_counter()
+            try:
+                run_function(fixture)
+            except Exception as e:
+                raise SystemExit(f'ERROR: case "{fixture.scale_name}/{case_name}" failed with the following error "{f"{e}".strip()}", leaving...')
+            finally:
+                timings.append(time.perf_counter() - start)
+                [tracer, tracing.TRACER] = [tracing.TRACER, None]
+
+        run_spans = dict()
+        for event in tracer.events:
+            run_spans[event['name']] = run_spans.get(event['name'], 0.0) + event['dur'] / 1000000
+        for [name, duration] in run_spans.items():
+            spans.setdefault(name, []).append(duration)
+
+    return {'median': statistics.median(timings),
+            'min':    min(timings),
+            'max':    max(timings),
+            'runs':   timings,
+            'spans':  {name: statistics.median(durations) for [name, durations] in sorted(spans.items())}}
+
+
+
+def compare_results(results, baseline, threshold, min_delta):
+    # A case regresses when its median is both relatively and absolutely slower than the baseline median
+    regressions = []
+    lines = [f'{"case":<36} {"baseline ms":>12} {"current ms":>12} {"change":>9}  status']
+    for [case_key, result] in results.items():
+        base = baseline.get(case_key)
+        if (base is None):
+            lines.append(f'{case_key:<36} {"-":>12} {result["median"] * 1000:>12.1f} {"-":>9}  NEW')
+            continue
+
+        change = (result['median'] - base['median']) / base['median'] if (base['median'] > 0) else 0.0
+        if (change > threshold) and (result['median'] - base['median'] > min_delta):
+            status = 'REGRESSION'
+            regressions.append(case_key)
+        elif (change < -threshold) and (base['median'] - result['median'] > min_delta):
+            status = 'IMPROVED'
+        else:
+            status = 'OK'
+        lines.append(f'{case_key:<36} {base["median"] * 1000:>12.1f} {result["median"] * 1000:>12.1f} {change * 100:>8.1f}%  {status}')
+
+    return [lines, regressions]
+
+
+
+def load_results(file_path):
+    with open(file_path, 'r') as file:
+        data = json.load(file)
+    if (data.get('version') != RESULTS_VERSION):
+        raise SystemExit(f'ERROR: results file "{file_path}" has an unsupported version, leaving...')
+    return data
+
+
+
+######################################################################################################################################################
+##  Main logic  ######################################################################################################################################
+######################################################################################################################################################
+
+
+
+def main(argv=None, state=None):
+    # Define argument parser
+    parser = argparse.ArgumentParser(
+                        prog='Build tooling benchmark script.',
+                        description='Times the build helpers on generated binary trees, repositories and archives, with fake gcovr and clang-format executables, and compares the results against a baseline.')
+
+    parser.add_argument('-w', '--work_dir',    action='store',      required=False, help='Directory holding the generated fixtures, kept between runs so that they are only generated once (temporary by default)')
+    parser.add_argument('-s', '--scales',      action='store',      required=False, default='small', help=f'Comma-separated scales of the fixtures ({", ".join(SCALES.keys())})')
+    parser.add_argument('-c', '--cases',       action='store',      required=False, default=','.join(CASES.keys()), help='Comma-separated cases to run')
+    parser.add_argument('-r', '--repeat',      action='store',      required=False, type=int, default=3, help='Number of timed repetitions of every case, the median is compared')
+    parser.add_argument('-o', '--output',      action='store',      required=False, default='./benchmark_results.json', help='JSON file the results are written to')
+    parser.add_argument('--baseline',          action='store',      required=False, help='JSON results of a previous run to compare against')
+    parser.add_argument('--save_baseline',     action='store_true', required=False, help='Also write the results to the baseline file instead of comparing against it')
+    parser.add_argument('--threshold',         action='store',      required=False, type=float, default=0.2, help='Relative slowdown of a median reported as a regression')
+    parser.add_argument('--min_delta',         action='store',      required=False, type=float, default=0.005, help='Absolute slowdown in seconds below which no regression is reported')
+
+    args = parser.parse_args(argv)
+
+    scales = [s.strip() for s in args.scales.split(',') if (len(s.strip()) > 0)]
+    cases = [s.strip() for s in args.cases.split(',') if (len(s.strip()) > 0)]
+    for [values, known, kind] in [[scales, SCALES, 'scale'], [cases, CASES, 'case']]:
+        for value in values:
+            if (value not in known):
+                raise SystemExit(f'ERROR: unknown {kind} "{value}", expected one of {", ".join(known.keys())}, leaving...')
+    if (args.repeat < 1):
+        raise SystemExit(f'ERROR: number of repetitions must be positive, leaving...')
+    if (args.save_baseline) and (args.baseline is None):
+        raise SystemExit(f'ERROR: --save_baseline requires --baseline, leaving...')
+    if (os.name == 'nt'):
+        raise SystemExit(f'ERROR: the fake tools of the benchmark are scripts and need a POSIX system, leaving...')
+
+    work_dir = args.work_dir if (args.work_dir is not None) else tempfile.mkdtemp(prefix='project_template_benchmark_')
+    results = dict()
+    skipped = []
+    try:
+        for scale_name in scales:
+            fixture = Fixture(work_dir, scale_name)
+            fixture.generate()
+
+            for case_name in cases:
+                result = run_case(fixture, case_name, args.repeat)
+                if (result is None):
+                    skipped.append(f'{scale_name}/{case_name}')
+                    continue
+
+                results[f'{scale_name}/{case_name}'] = result
+                print(f'BENCHMARK: {scale_name}/{case_name:<24} median {result["median"] * 1000:>10.1f} ms (min {result["min"] * 1000:.1f} ms, max {result["max"] * 1000:.1f} ms)')
+    finally:
+        if (args.work_dir is None):
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if (len(skipped) > 0):
+        print(f'WARNING: the configurator cannot be imported by Python {sys.version.split()[0]}, skipped: {", ".join(skipped)}')
+
+    output = {'version':   RESULTS_VERSION,
+              'created':   time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python':    sys.version.split()[0],
+              'platform':  sys.platform,
+              'cpu_count': os.cpu_count(),
+              'repeat':    args.repeat,
+              'scales':    {scale_name: SCALES[scale_name] for scale_name in scales},
+              'results':   results}
+
+    for file_path in [args.output] + ([args.baseline] if (args.save_baseline) else []):
+        Path(os.path.dirname(os.path.abspath(file_path))).mkdir(parents=True, exist_ok=True)
+        with open(file_path, 'w') as file:
+            json.dump(output, file, indent=1)
+        print(f'Results written to {file_path}')
+
+    if (args.baseline is None) or (args.save_baseline):
+        print(f'COMPLETE: Finished running benchmarks')
+        return 0
+
+    [lines, regressions] = compare_results(results, load_results(args.baseline)['results'], args.threshold, args.min_delta)
+    for line in lines:
+        print(line)
+
+    if (len(regressions) > 0):
+        print(f'ERROR: {len(regressions)} benchmarks regressed by more than {args.threshold * 100:.0f}% against {args.baseline}, leaving...')
+        return -1
+
+    print(f'COMPLETE: Finished running benchmarks, no regressions against {args.baseline}')
+    return 0
+
+
+
+if (__name__ == '__main__'):
+    sys.exit(main())
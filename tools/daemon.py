@@ -0,0 +1,366 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+import os
+import sys
+import json
+import time
+import shlex
+import select
+import socket
+import secrets
+import argparse
+import threading
+import contextlib
+import socketserver
+from pathlib import Path
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .pipeline import STAGES, run_stage, import_tool_module
+    from .tracing import finish_tracing
+    from .run_report import finish_run_report
+    from .include_graph import ROOT_DIR, DEFAULT_SOURCE_DIRS, SOURCE_EXTENSIONS, normalize_path, load_index
+except ImportError:
+    from pipeline import STAGES, run_stage, import_tool_module
+    from tracing import finish_tracing
+    from run_report import finish_run_report
+    from include_graph import ROOT_DIR, DEFAULT_SOURCE_DIRS, SOURCE_EXTENSIONS, normalize_path, load_index
+
+
+
+######################################################################################################################################################
+##  Helper methods  ##################################################################################################################################
+######################################################################################################################################################
+
+
+
+DAEMON_FILE       = '.tools_daemon.json'
+BINARY_EXTENSIONS = ['.exe', '.dll', '.pdb']
+POLL_INTERVAL     = 1.0
+SETTLE_TIME       = 0.5
+
+IN_ATTRIB         = 0x00000004
+IN_CLOSE_WRITE    = 0x00000008
+IN_MOVED_FROM     = 0x00000040
+IN_MOVED_TO       = 0x00000080
+IN_CREATE         = 0x00000100
+IN_DELETE         = 0x00000200
+IN_Q_OVERFLOW     = 0x00004000
+IN_ISDIR          = 0x40000000
+IN_CLOEXEC        = 0o2000000
+WATCH_MASK        = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+
+class InotifyWatcher:
+    def __init__(self, roots):
+        import ctypes
+
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if (self.fd < 0):
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self.roots = roots
+        self.watches = dict()
+        for root in roots:
+            self.add_tree(root)
+
+    def add_tree(self, root):
+        # Directories created later are added as their creation is reported, the files already inside are reported right away
+        added = []
+        for [dir_path, dir_names, file_names] in os.walk(root):
+            dir_path = Path(dir_path).as_posix()
+            watch = self.libc.inotify_add_watch(self.fd, dir_path.encode(), WATCH_MASK)
+            if (watch >= 0):
+                self.watches[watch] = dir_path
+            added += [f'{dir_path}/{file_name}' for file_name in file_names]
+        return added
+
+    def poll(self, timeout):
+        changed = set()
+        if (len(select.select([self.fd], [], [], timeout)[0]) == 0):
+            return changed
+
+        data = os.read(self.fd, 1024 * 1024)
+        offset = 0
+        while (offset + 16 <= len(data)):
+            [watch, mask, cookie, length] = [int.from_bytes(data[offset + index:offset + index + 4], sys.byteorder, signed=(index == 0)) for index in [0, 4, 8, 12]]
+            name = data[offset + 16:offset + 16 + length].split(b'\0', 1)[0].decode(errors='replace')
+            offset += 16 + length
+
+            # A lost queue can hide anything, the roots themselves stand for "everything changed"
+            if (mask & IN_Q_OVERFLOW):
+                changed.update(self.roots)
+            elif (watch in self.watches) and (name != ''):
+                path = f'{self.watches[watch]}/{name}'
+                changed.add(path)
+                if (mask & IN_ISDIR) and (mask & (IN_CREATE | IN_MOVED_TO)):
+                    changed.update(self.add_tree(path))
+
+        return changed
+
+
+
+class PollingWatcher:
+    def __init__(self, roots, interval=POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = dict()
+        for root in self.roots:
+            for [dir_path, dir_names, file_names] in os.walk(root):
+                for file_name in file_names:
+                    file_path = Path(f'{dir_path}/{file_name}').as_posix()
+                    try:
+                        file_stat = os.stat(file_path)
+                        snapshot[file_path] = [file_stat.st_size, file_stat.st_mtime_ns]
+                    except OSError:
+                        pass
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(max(timeout, self.interval))
+        snapshot = self.scan()
+        changed = set(file_path for file_path in set(snapshot.keys()) | set(self.snapshot.keys()) if (snapshot.get(file_path) != self.snapshot.get(file_path)))
+        self.snapshot = snapshot
+        return changed
+
+
+
+def create_watcher(roots, polling=False):
+    # inotify is only available on Linux, everything else falls back to comparing stat snapshots
+    if (polling == False) and (sys.platform.startswith('linux')):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(roots)
+
+
+
+class StreamWriter:
+    # Stage output is forwarded to the client line by line, a client that went away only stops the forwarding
+    def __init__(self, stream):
+        self.stream = stream
+        self.broken = False
+
+    def write(self, text):
+        if (len(text) > 0) and (self.broken == False):
+            try:
+                self.stream.write((json.dumps({'out': text}) + '\n').encode())
+            except OSError:
+                self.broken = True
+        return len(text)
+
+    def flush(self):
+        if (self.broken == False):
+            try:
+                self.stream.flush()
+            except OSError:
+                self.broken = True
+
+
+
+class Daemon:
+    def __init__(self, args):
+        self.args = args
+        self.bin_dir = Path(os.path.abspath(args.daemon_dir)).as_posix()
+        self.source_dirs = [normalize_path(source_dir, ROOT_DIR) for source_dir in args.watch.split(',') if (source_dir != '')]
+        self.stage_args = shlex.split(args.stage_args) if (args.stage_args is not None) else None
+        self.token = secrets.token_hex(16)
+        self.state = dict()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        # Own messages go to the console the daemon was started from, the standard output is redirected to the client during a stage
+        self.log = sys.stdout
+
+    def log_message(self, message):
+        print(message, file=self.log, flush=True)
+
+    def run_stage(self, stage_name, argv, cwd, stdout, environment=None):
+        # Stages print and change nothing but the working directory and the environment, one stage at a time keeps them consistent
+        with self.lock:
+            previous_cwd = os.getcwd()
+            previous_environment = dict(os.environ)
+            try:
+                os.chdir(cwd)
+                if (environment is not None):
+                    # The stage sees the environment of the build that requested it (trace and run report files, PATH, ...)
+                    os.environ.clear()
+                    os.environ.update(environment)
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stdout):
+                    try:
+                        return run_stage(stage_name, argv, self.state)
+                    finally:
+                        # The daemon outlives the request, its trace and run report are written as the stage ends instead of at exit
+                        finish_tracing()
+                        finish_run_report()
+            except Exception as e:
+                print(f'ERROR: stage "{stage_name}" failed in the daemon with the following error "{e}"', file=stdout)
+                return -1
+            finally:
+                os.chdir(previous_cwd)
+                if (environment is not None):
+                    os.environ.clear()
+                    os.environ.update(previous_environment)
+
+    def process_changes(self, changed):
+        sources = [path for path in changed if (os.path.splitext(path)[1].lower() in SOURCE_EXTENSIONS) and (path.startswith(f'{self.bin_dir}/') == False)]
+        binaries = [path for path in changed if (os.path.splitext(path)[1].lower() in BINARY_EXTENSIONS) and (path.startswith(f'{self.bin_dir}/'))]
+
+        # Sources are hashed and indexed as soon as they are saved, the next pre-build step only looks them up
+        if (len(sources) > 0):
+            with self.lock:
+                hash_file = import_tool_module('pre_build_tasks').hash_file
+                for source in sources:
+                    if (os.path.isfile(source)):
+                        hash_file(source, self.state.setdefault('hash_cache', dict()))
+                load_index(self.bin_dir, state=self.state)
+            self.log_message(f'DAEMON: {len(sources)} changed sources hashed and indexed')
+
+        # Freshly linked binaries are staged right away, the post-build step then finds them up to date
+        if (len(binaries) > 0) and (self.stage_args is not None):
+            stage_argv = [argument for argument in self.stage_args if (argument.startswith('--changed') == False)] + ['--copy_only']
+            returncode = self.run_stage('post_build', stage_argv, ROOT_DIR, self.log)
+            self.log_message(f'DAEMON: {len(binaries)} changed binaries staged with code {returncode}')
+
+    def watch(self):
+        watcher = create_watcher([path for path in self.source_dirs + [self.bin_dir] if (os.path.isdir(path))], self.args.polling)
+        self.log_message(f'DAEMON: watching {", ".join(watcher.roots)} with {type(watcher).__name__}')
+
+        # Changes are collected until the tree settles, a build writes many files in a burst
+        pending = set()
+        while (self.stopped.is_set() == False):
+            changed = watcher.poll(SETTLE_TIME)
+            if (len(changed) > 0):
+                pending.update(changed)
+            elif (len(pending) > 0):
+                self.process_changes(pending)
+                pending = set()
+
+    def serve(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request = json.loads(self.rfile.readline())
+                if (request.get('token') != daemon.token):
+                    return
+                if (request.get('command') == 'stop'):
+                    daemon.stopped.set()
+                    self.wfile.write((json.dumps({'returncode': 0}) + '\n').encode())
+                    return
+
+                returncode = daemon.run_stage(request['stage'], request['argv'], request['cwd'], StreamWriter(self.wfile), request.get('env'))
+                self.wfile.write((json.dumps({'returncode': returncode}) + '\n').encode())
+
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        # Only processes that can read the daemon file (its owner) learn the token
+        daemon_file = f'{self.bin_dir}/{DAEMON_FILE}'
+        Path(self.bin_dir).mkdir(parents=True, exist_ok=True)
+        with open(os.open(daemon_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as file:
+            json.dump({'port': server.server_address[1], 'token': self.token, 'pid': os.getpid()}, file)
+
+        return [server, daemon_file]
+
+
+
+def request_daemon(daemon_dir, request, timeout=1.0):
+    # Returns None when no daemon answers, so the caller can fall back to running the stage itself
+    daemon_file = f'{Path(os.path.abspath(daemon_dir)).as_posix()}/{DAEMON_FILE}'
+    if (os.path.isfile(daemon_file) == False):
+        return None
+
+    try:
+        with open(daemon_file, 'r') as file:
+            daemon_info = json.load(file)
+        connection = socket.create_connection(('127.0.0.1', daemon_info['port']), timeout=timeout)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    with connection:
+        connection.settimeout(None)
+        connection.sendall((json.dumps(dict(request, token=daemon_info['token'])) + '\n').encode())
+
+        for line in connection.makefile('rb'):
+            message = json.loads(line)
+            if ('out' in message):
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif ('returncode' in message):
+                return message['returncode']
+
+    print(f'ERROR: the daemon dropped the connection before the stage finished, leaving...')
+    return -1
+
+
+
+######################################################################################################################################################
+##  Main logic  ######################################################################################################################################
+######################################################################################################################################################
+
+
+
+def main(argv=None, state=None):
+    # Define argument parser
+    parser = argparse.ArgumentParser(
+                        prog='Build helper daemon.',
+                        description='Keeps the build helpers warm between builds, or hands a stage to the running daemon (running it in-process when there is none).')
+
+    parser.add_argument('command',             action='store',      choices=['serve', 'run', 'stop'], help='serve: start the daemon, run: execute a stage through the daemon, stop: shut the daemon down')
+    parser.add_argument('-d', '--daemon_dir',  action='store',      required=False, default='.', help='Directory holding the daemon file, usually the CMake binary directory, which is also watched')
+    parser.add_argument('--watch',             action='store',      required=False, default=DEFAULT_SOURCE_DIRS, help='Comma-separated source directories watched by the daemon, relative to the repository root')
+    parser.add_argument('--stage_args',        action='store',      required=False, help='Arguments of the post-build stage, used to stage new binaries as soon as they are linked')
+    parser.add_argument('--polling',           action='store_true', required=False, help='Compare stat snapshots instead of using inotify')
+    parser.add_argument('--no_fallback',       action='store_true', required=False, help='Fail instead of running the stage in-process when no daemon is running')
+
+    # Everything from the stage name on belongs to the stage: daemon.py run -d build post_build -m=gcc ...
+    argv = argv if (argv is not None) else sys.argv[1:]
+    stage_index = next((index for [index, argument] in enumerate(argv) if (argument in STAGES)), len(argv))
+    args = parser.parse_args(argv[:stage_index])
+    stage_argv = argv[stage_index:]
+
+    if (args.command == 'serve'):
+        daemon = Daemon(args)
+        [server, daemon_file] = daemon.serve()
+        print(f'DAEMON: listening on port {server.server_address[1]}, stop with "daemon.py stop -d {args.daemon_dir}"', flush=True)
+        try:
+            daemon.watch()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            os.remove(daemon_file)
+        return 0
+
+    if (args.command == 'stop'):
+        return 0 if (request_daemon(args.daemon_dir, {'command': 'stop'}) == 0) else -1
+
+    if (len(stage_argv) == 0):
+        raise SystemExit(f'ERROR: specify the stage to run, leaving...')
+
+    returncode = request_daemon(args.daemon_dir, {'stage': stage_argv[0], 'argv': stage_argv[1:], 'cwd': os.getcwd(), 'env': dict(os.environ)})
+    if (returncode is None):
+        if (args.no_fallback):
+            raise SystemExit(f'ERROR: no daemon is running for {args.daemon_dir}, leaving...')
+        returncode = run_stage(stage_argv[0], stage_argv[1:], state)
+    return returncode
+
+
+
+if (__name__ == '__main__'):
+    sys.exit(main())
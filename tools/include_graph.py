@@ -0,0 +1,332 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+import os
+import sys
+import re
+import json
+import shlex
+import hashlib
+import argparse
+from pathlib import Path
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .json_files import load_json_file, save_json_file
+except ImportError:
+    from json_files import load_json_file, save_json_file
+
+
+
+######################################################################################################################################################
+##  Helper methods  ##################################################################################################################################
+######################################################################################################################################################
+
+
+
+ROOT_DIR            = Path(__file__).resolve().parent.parent.as_posix()
+DEFAULT_SOURCE_DIRS = 'src,projTemplate_EXE,projTemplate_DLL,projTemplate_TEST'
+SOURCE_EXTENSIONS   = ['.hpp', '.h', '.hh', '.hxx', '.inl', '.ipp', '.cpp', '.cc', '.cxx', '.c']
+INCLUDE_PATTERN     = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\r\n]+)[>"]', re.MULTILINE)
+BUILD_FILE_NAMES    = ['CMakeLists.txt', 'CMakePresets.json']
+INDEX_VERSION       = 1
+
+
+
+def normalize_path(path, base_dir=None):
+    path = os.path.join(base_dir, path) if (base_dir is not None) else path
+    return Path(os.path.normpath(os.path.abspath(path))).as_posix()
+
+
+
+def unit_target(entry, arguments):
+    # CMake places every object under CMakeFiles/<target>.dir, which names the target the unit belongs to
+    output = entry.get('output')
+    if (output is None) and ('-o' in arguments) and (arguments.index('-o') + 1 < len(arguments)):
+        output = arguments[arguments.index('-o') + 1]
+
+    if (output is not None):
+        for part in Path(output.replace('\\', '/')).parts:
+            if (part.endswith('.dir')):
+                return part[:-len('.dir')]
+
+    return None
+
+
+
+def unit_include_dirs(arguments, directory):
+    include_dirs = []
+    for [index, argument] in enumerate(arguments):
+        for flag in ['-I', '-isystem', '-iquote'] + (['/I'] if (os.name == 'nt') else []):
+            if (argument == flag) and (index + 1 < len(arguments)):
+                include_dirs.append(normalize_path(arguments[index + 1], directory))
+            elif (argument.startswith(flag)) and (len(argument) > len(flag)):
+                include_dirs.append(normalize_path(argument[len(flag):], directory))
+
+    return include_dirs
+
+
+
+def read_compile_commands(bin_dir):
+    compile_commands = load_json_file(f'{bin_dir}/compile_commands.json', [])
+
+    units = dict()
+    for entry in compile_commands:
+        arguments = entry['arguments'] if ('arguments' in entry) else shlex.split(entry['command'], posix=(os.name != 'nt'))
+        unit = normalize_path(entry['file'], entry['directory'])
+        units[f'{unit}|{unit_target(entry, arguments)}'] = {'file':         unit,
+                                                           'target':       unit_target(entry, arguments),
+                                                           'include_dirs': unit_include_dirs(arguments, entry['directory']),
+                                                           'command':      hashlib.sha1(json.dumps([entry['directory'], arguments]).encode()).hexdigest()}
+
+    return units
+
+
+
+def scan_source_dirs(source_dirs):
+    files = dict()
+    for source_dir in source_dirs:
+        for [dir_path, dir_names, file_names] in os.walk(source_dir):
+            for file_name in file_names:
+                if (os.path.splitext(file_name)[1].lower() in SOURCE_EXTENSIONS):
+                    file_path = Path(f'{dir_path}/{file_name}').as_posix()
+                    file_stat = os.stat(file_path)
+                    files[file_path] = [file_stat.st_size, file_stat.st_mtime_ns]
+
+    return files
+
+
+
+def build_files(source_dirs, bin_dir):
+    # Build scripts and the configured cache change what gets built without touching any indexed source
+    files = [f'{ROOT_DIR}/{file_name}' for file_name in BUILD_FILE_NAMES] + [f'{bin_dir}/CMakeCache.txt', f'{bin_dir}/compile_commands.json']
+    for source_dir in source_dirs:
+        for [dir_path, dir_names, file_names] in os.walk(source_dir):
+            files += [Path(f'{dir_path}/{file_name}').as_posix() for file_name in file_names if (file_name in BUILD_FILE_NAMES) or (file_name.endswith('.cmake'))]
+
+    return files
+
+
+
+def test_executable(bin_dir, project_name):
+    # Same location the post-build script runs the test binaries from
+    return f'{bin_dir}/{project_name}/{project_name}.exe'
+
+
+
+def file_fingerprint(file_path):
+    try:
+        file_stat = os.stat(file_path)
+        return f'{file_stat.st_size}|{file_stat.st_mtime_ns}'
+    except OSError:
+        return None
+
+
+
+def update_index(index, source_dirs, bin_dir):
+    # Only the files whose size or time stamp moved are read again, everything else keeps its parsed includes
+    files = dict()
+    for [file_path, [file_size, file_mtime]] in scan_source_dirs(source_dirs).items():
+        entry = index['files'].get(file_path)
+        if (entry is not None) and (entry['size'] == file_size) and (entry['mtime'] == file_mtime):
+            files[file_path] = entry
+            continue
+
+        with open(file_path, 'rb') as file:
+            content = file.read()
+        files[file_path] = {'size':     file_size,
+                            'mtime':    file_mtime,
+                            'hash':     hashlib.sha1(content).hexdigest(),
+                            'includes': [[kind.decode(), name.decode(errors='replace').strip()] for [kind, name] in INCLUDE_PATTERN.findall(content)]}
+
+    units = read_compile_commands(bin_dir)
+    search_dirs = []
+    for unit in units.values():
+        search_dirs += [include_dir for include_dir in unit['include_dirs'] if (include_dir not in search_dirs)]
+
+    # Includes are only resolved against the indexed files, system and third-party headers never change the impact
+    for [file_path, entry] in files.items():
+        resolved = []
+        for [kind, name] in entry['includes']:
+            candidates = ([normalize_path(name, os.path.dirname(file_path))] if (kind == '"') else []) + [normalize_path(name, search_dir) for search_dir in search_dirs]
+            for candidate in candidates:
+                if (candidate in files):
+                    resolved.append(candidate)
+                    break
+        entry['resolved'] = resolved
+
+    index['files'] = files
+    index['units'] = units
+    return index
+
+
+
+def load_index(bin_dir, source_dirs=None, state=None):
+    # An index already loaded in this interpreter is only brought up to date, not read from disk again
+    indexes = state.setdefault('include_graph', dict()) if (state is not None) else dict()
+    index = indexes[bin_dir] if (bin_dir in indexes) else load_json_file(f'{bin_dir}/include_graph.json', None)
+    if (index is None) or (index.get('version') != INDEX_VERSION):
+        index = {'version': INDEX_VERSION, 'files': dict(), 'units': dict(), 'seen': dict()}
+    indexes[bin_dir] = index
+
+    source_dirs = [normalize_path(source_dir, ROOT_DIR) for source_dir in (source_dirs if (source_dirs is not None) else DEFAULT_SOURCE_DIRS.split(','))]
+    return update_index(index, [source_dir for source_dir in source_dirs if (os.path.isdir(source_dir))], bin_dir)
+
+
+
+def save_index(bin_dir, index):
+    save_json_file(f'{bin_dir}/include_graph.json', index)
+
+
+
+def changes_since(index, consumer, watched_files=[]):
+    # Every consumer keeps its own snapshot, so one step catching up does not hide the changes from the others
+    snapshot = {file_path: entry['hash'] for [file_path, entry] in index['files'].items()}
+    snapshot.update({f'unit:{unit_key}': unit['command'] for [unit_key, unit] in index['units'].items()})
+
+    # Files outside the graph (build scripts, linked test binaries) are only compared by size and time stamp
+    snapshot.update({f'watch:{file_path}': file_fingerprint(file_path) for file_path in watched_files})
+
+    # The snapshot only becomes the new baseline once the consumer acknowledges it, a failed step sees the same changes again
+    previous = index['seen'].get(consumer)
+    index['seen'][f'{consumer}:pending'] = snapshot
+    if (previous is None):
+        return None
+
+    # A unit whose compile command changed counts as a changed source file
+    changed = set()
+    for key in set(snapshot.keys()) | set(previous.keys()):
+        if (snapshot.get(key) != previous.get(key)):
+            if (key.startswith('unit:')):
+                changed.add(key[len('unit:'):].split('|')[0])
+            else:
+                changed.add(key[len('watch:'):] if (key.startswith('watch:')) else key)
+
+    return changed
+
+
+
+def analyse_impact(index, changed_files, test_projects=[], outputs=dict()):
+    includers = dict()
+    for [file_path, entry] in index['files'].items():
+        for resolved in entry['resolved']:
+            includers.setdefault(resolved, set()).add(file_path)
+
+    changed_files = set(normalize_path(changed_file, ROOT_DIR) for changed_file in changed_files)
+    unit_files = set(unit['file'] for unit in index['units'].values())
+
+    # A relinked test binary affects its test project whatever caused the relink
+    relinked = set(outputs[changed_file] for changed_file in changed_files if (changed_file in outputs))
+    changed_sources = [changed_file for changed_file in changed_files if (changed_file not in outputs)]
+
+    # Files that are neither sources nor headers (build scripts, removed files) cannot be traced, callers fall back to everything
+    unknown = set(changed_file for changed_file in changed_sources if (changed_file not in index['files']) and (changed_file not in unit_files))
+
+    affected = set()
+    for changed_file in changed_sources:
+        reached = set()
+        pending = [changed_file]
+        while (len(pending) > 0):
+            file_path = pending.pop()
+            if (file_path in reached):
+                continue
+            reached.add(file_path)
+            pending += list(includers.get(file_path, []))
+
+        # Without a compile database, or for a file no unit builds, nothing tells which targets it reaches
+        if (len(reached & unit_files) == 0):
+            unknown.add(changed_file)
+        affected |= reached
+
+    units = sorted(set(unit['file'] for unit in index['units'].values() if (unit['file'] in affected)))
+    targets = sorted(set(unit['target'] for unit in index['units'].values() if (unit['file'] in affected) and (unit['target'] is not None)))
+
+    return {'changed': sorted(changed_files),
+            'files':   sorted(affected),
+            'units':   units,
+            'targets': targets,
+            'tests':   sorted(set(target for target in targets if (target in test_projects)) | (relinked & set(test_projects))),
+            'unknown': sorted(unknown)}
+
+
+
+def affected_by_changes(bin_dir, changed, consumer, test_projects=[], source_dirs=None, state=None):
+    # Either the explicit list of changed files, or "auto" for everything that changed since the consumer last asked
+    index = load_index(bin_dir, source_dirs, state)
+    outputs = {test_executable(bin_dir, test_project): test_project for test_project in test_projects}
+
+    if (changed == 'auto'):
+        source_dirs = [normalize_path(source_dir, ROOT_DIR) for source_dir in (source_dirs if (source_dirs is not None) else DEFAULT_SOURCE_DIRS.split(','))]
+        changed_files = changes_since(index, consumer, build_files(source_dirs, bin_dir) + list(outputs.keys()))
+    else:
+        changed_files = [changed_file for changed_file in changed.split(',') if (changed_file != '')]
+    save_index(bin_dir, index)
+
+    if (changed_files is None):
+        return None
+    return analyse_impact(index, changed_files, test_projects, outputs)
+
+
+
+def acknowledge_changes(bin_dir, consumer, state=None):
+    indexes = state.get('include_graph', dict()) if (state is not None) else dict()
+    index = indexes[bin_dir] if (bin_dir in indexes) else load_json_file(f'{bin_dir}/include_graph.json', None)
+    if (index is None) or (f'{consumer}:pending' not in index['seen']):
+        return
+
+    index['seen'][consumer] = index['seen'].pop(f'{consumer}:pending')
+    save_index(bin_dir, index)
+
+
+
+######################################################################################################################################################
+##  Main logic  ######################################################################################################################################
+######################################################################################################################################################
+
+
+
+def main(argv=None, state=None):
+    # Every stage can be run in-process, the state carries indexes and caches from one stage to the next
+    state = state if (state is not None) else dict()
+
+    # Define argument parser
+    parser = argparse.ArgumentParser(
+                        prog='Include graph index helper script.',
+                        description='Keeps an index of the #include graph of the sources and reports the units, targets and test binaries affected by changes.')
+
+    parser.add_argument('-b', '--bin_dir',     action='store',      required=True,  help='Output of all generated files for the build (equivalent to CMAKE_CURRENT_BINARY_DIR), holds compile_commands.json and the index')
+    parser.add_argument('-c', '--changed',     action='store',      required=False, default='auto', help='Comma-separated changed files, or "auto" for the files changed since the previous query')
+    parser.add_argument('-t', '--test_proj',   action='store',      required=False, default='', help='Comma-separated test projects in the build')
+    parser.add_argument('--source_dirs',       action='store',      required=False, default=DEFAULT_SOURCE_DIRS, help='Comma-separated directories holding the indexed sources, relative to the repository root')
+    parser.add_argument('--json',              action='store_true', required=False, help='Print the impact as JSON')
+
+    args = parser.parse_args(argv)
+
+    bin_dir = Path(os.path.abspath(args.bin_dir)).as_posix()
+    impact = affected_by_changes(bin_dir, args.changed, 'include_graph', [s.strip() for s in args.test_proj.split(',') if (len(s) > 0)], args.source_dirs.split(','), state)
+    acknowledge_changes(bin_dir, 'include_graph', state)
+
+    if (impact is None):
+        print(f'Index created, changes are reported from the next run on')
+    elif (args.json):
+        print(json.dumps(impact, indent=1))
+    else:
+        for key in ['units', 'targets', 'tests', 'unknown']:
+            print(f'{key.upper()}:')
+            for value in impact[key]:
+                print(f'\t{value}')
+
+    print(f'COMPLETE: Finished processing files')
+    return 0
+
+
+
+if (__name__ == '__main__'):
+    sys.exit(main())
@@ -0,0 +1,41 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+import os
+import json
+from pathlib import Path
+
+
+
+######################################################################################################################################################
+##  Helper methods  ##################################################################################################################################
+######################################################################################################################################################
+
+
+
+def load_json_file(file_path, default):
+    if (os.path.isfile(file_path) == False):
+        return default
+
+    try:
+        with open(file_path, 'r') as file:
+            return json.load(file)
+    except Exception:
+        return default
+
+
+
+def save_json_file(file_path, data, indent=1):
+    # Write aside and swap so that an interrupted run never leaves a truncated file behind
+    Path(os.path.dirname(file_path)).mkdir(parents=True, exist_ok=True)
+
+    with open(f'{file_path}.tmp', 'w') as file:
+        json.dump(data, file, indent=indent)
+    os.replace(f'{file_path}.tmp', file_path)
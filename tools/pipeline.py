@@ -0,0 +1,129 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+import sys
+import time
+import importlib
+
+
+
+######################################################################################################################################################
+##  Helper methods  ##################################################################################################################################
+######################################################################################################################################################
+
+
+
+STAGES = {'configure':  ['project_configurator', 'Main'],
+          'pre_build':  ['pre_build_tasks',      'main'],
+          'post_build': ['post_build_tasks',     'main'],
+          'impact':     ['include_graph',        'main']}
+
+
+
+def import_tool_module(module_name):
+    return importlib.import_module(f'{__package__}.{module_name}' if (__package__) else module_name)
+
+
+
+def load_stage(stage_name):
+    if (stage_name not in STAGES):
+        raise SystemExit(f'ERROR: unknown stage "{stage_name}", expected one of {", ".join(STAGES.keys())}, leaving...')
+
+    # Stage modules are only imported once the stage runs, so a driver that only builds never loads the configurator
+    [module_name, function_name] = STAGES[stage_name]
+    return getattr(import_tool_module(module_name), function_name)
+
+
+
+def run_stage(stage_name, argv=None, state=None):
+    try:
+        return load_stage(stage_name)(argv, state)
+    except SystemExit as e:
+        # Stages fail through SystemExit like their command line versions, the message is printed and turned into a return code
+        if (e.code is None) or (isinstance(e.code, int)):
+            return e.code if (e.code is not None) else 0
+        print(e.code)
+        return -1
+
+
+
+def run_pipeline(stages, state=None):
+    # The state is shared by all stages, so indexes and caches loaded by one stage are reused by the next
+    state = state if (state is not None) else dict()
+
+    for [stage_name, argv] in stages:
+        start = time.perf_counter()
+        returncode = run_stage(stage_name, argv, state)
+        print(f'PIPELINE: stage "{stage_name}" finished with code {returncode} in {time.perf_counter() - start:.2f} s')
+
+        if (returncode != 0):
+            return returncode
+
+    return 0
+
+
+
+def configure(argv=None, state=None):
+    return run_stage('configure', argv, state)
+
+
+
+def pre_build(argv=None, state=None):
+    return run_stage('pre_build', argv, state)
+
+
+
+def post_build(argv=None, state=None):
+    return run_stage('post_build', argv, state)
+
+
+
+def impact(argv=None, state=None):
+    return run_stage('impact', argv, state)
+
+
+
+def split_stages(argv):
+    # Stage names separate the argument lists: configure -f req.json pre_build -b=bin ... post_build -m=gcc ...
+    stages = []
+    for argument in argv:
+        if (argument in STAGES):
+            stages.append([argument, []])
+        elif (len(stages) == 0):
+            raise SystemExit(f'ERROR: arguments must follow a stage name ({", ".join(STAGES.keys())}), leaving...')
+        else:
+            stages[-1][1].append(argument)
+
+    return stages
+
+
+
+######################################################################################################################################################
+##  Main logic  ######################################################################################################################################
+######################################################################################################################################################
+
+
+
+def main(argv=None, state=None):
+    argv = argv if (argv is not None) else sys.argv[1:]
+
+    if (len(argv) == 0) or (argv[0] in ['-h', '--help']):
+        print(f'usage: pipeline.py STAGE [STAGE ARGUMENTS] [STAGE [STAGE ARGUMENTS] ...]')
+        print(f'Runs the stages in order in a single interpreter, stages: {", ".join(STAGES.keys())}')
+        return 0
+
+    returncode = run_pipeline(split_stages(argv), state)
+    print(f'COMPLETE: Finished processing stages' if (returncode == 0) else f'ERROR: pipeline stopped after a failing stage, leaving...')
+    return returncode
+
+
+
+if (__name__ == '__main__'):
+    sys.exit(main())
@@ -9,10 +9,34 @@
 
 
 import os
+import sys
+import json
 import shutil
+import hashlib
+import time
+import heapq
+import errno
 import argparse
 import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .include_graph import affected_by_changes, acknowledge_changes
+    from .json_files import load_json_file, save_json_file
+    from .tracing import TRACE_ENVIRONMENT, traced, trace_counters, enable_tracing
+    from .run_report import REPORT_ENVIRONMENT, AccountedProcess, run_process, enable_run_report
+except ImportError:
+    from include_graph import affected_by_changes, acknowledge_changes
+    from json_files import load_json_file, save_json_file
+    from tracing import TRACE_ENVIRONMENT, traced, trace_counters, enable_tracing
+    from run_report import REPORT_ENVIRONMENT, AccountedProcess, run_process, enable_run_report
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 
@@ -22,7 +46,240 @@ from pathlib import Path
 
 
 
-def copy_files(out_dir, clear=False, file=None, src_dir=None, extensions=None, recursive=False, keep_paths=False, shrink=False, ignore=False):
+MANIFEST_DIR = '.copy_manifests'
+
+# Linux ioctl cloning the extents of one file into another (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Staging methods attempted for each link mode, in order, the plain copy being the last resort
+LINK_MODES = {'copy':            ['copy'],
+              'auto':            ['reflink', 'copy_file_range', 'copy'],
+              'hardlink':        ['hardlink', 'copy'],
+              'reflink':         ['reflink', 'copy_file_range', 'copy'],
+              'copy_file_range': ['copy_file_range', 'copy'],
+              'symlink':         ['symlink', 'copy'],
+              'link':            ['hardlink', 'reflink', 'symlink', 'copy']}
+
+# Methods that share the data with the source instead of writing it again
+LINKED_METHODS = ['hardlink', 'reflink', 'symlink']
+
+# Default number of concurrent copies and the minimum delay between two aggregated progress reports (in seconds)
+COPY_JOBS = min(8, os.cpu_count() or 1)
+PROGRESS_INTERVAL = 1.0
+
+# Weight of the latest measurement in the recorded test durations, number of runs a failure is considered recent for,
+# and the longest test filter passed to a single test run (the environment limit on Windows being 32767 characters)
+TIMINGS_ALPHA = 0.5
+RECENT_FAILURE_RUNS = 5
+MAX_FILTER_LENGTH = 30000
+
+# Largest number of coverage objects traced by a single gcovr call, a changed object has its whole batch traced again
+COVERAGE_BATCH_SIZE = 64
+
+
+
+def stage_reflink(in_file, out_file):
+    if (fcntl is None):
+        raise OSError(errno.ENOTSUP, 'reflink is not supported on this platform')
+
+    with open(in_file, 'rb') as src, open(out_file, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(out_file)
+            raise
+
+
+
+def stage_copy_file_range(in_file, out_file):
+    kernel_copy = getattr(os, 'copy_file_range', None)
+    if (kernel_copy is None):
+        kernel_copy = getattr(os, 'sendfile', None)
+    if (kernel_copy is None):
+        raise OSError(errno.ENOTSUP, 'in-kernel copy is not supported on this platform')
+
+    with open(in_file, 'rb') as src, open(out_file, 'wb') as dst:
+        try:
+            remaining = os.fstat(src.fileno()).st_size
+            offset = 0
+            while (remaining > 0):
+                if (kernel_copy is os.sendfile):
+                    copied = os.sendfile(dst.fileno(), src.fileno(), offset, remaining)
+                else:
+                    copied = kernel_copy(src.fileno(), dst.fileno(), remaining)
+                if (copied == 0):
+                    break
+                offset += copied
+                remaining -= copied
+        except OSError:
+            dst.close()
+            os.remove(out_file)
+            raise
+
+
+
+def stage_file(in_file, out_file, link_mode='copy'):
+    # Never write through a link left by a previous staging
+    if (os.path.lexists(out_file)):
+        os.remove(out_file)
+
+    last_error = None
+    for method in LINK_MODES[link_mode]:
+        try:
+            if (method == 'hardlink'):
+                os.link(in_file, out_file)
+            elif (method == 'symlink'):
+                os.symlink(in_file, out_file)
+            elif (method == 'reflink'):
+                stage_reflink(in_file, out_file)
+            elif (method == 'copy_file_range'):
+                stage_copy_file_range(in_file, out_file)
+            else:
+                shutil.copyfile(in_file, out_file)
+            return method
+        except (OSError, NotImplementedError) as e:
+            last_error = e
+
+    raise last_error
+
+
+
+def stage_pending_file(in_file, out_file, link_mode, hash_files):
+    method = stage_file(in_file, out_file, link_mode)
+    file_hash = hash_file(in_file) if (hash_files) else None
+
+    return [method, os.stat(out_file).st_mtime_ns, file_hash]
+
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if (size < 1024) or (unit == 'GB'):
+            return f'{size:.1f} {unit}' if (unit != 'B') else f'{size} {unit}'
+        size = size / 1024
+
+
+
+def hash_file(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for byte_block in iter(lambda: file.read(1024 * 1024), b""):
+            file_hash.update(byte_block)
+
+    return file_hash.hexdigest()
+
+
+
+def manifest_path(out_dir, src_dir, extensions, recursive, keep_paths, shrink):
+    # Every distinct search gets its own manifest so that searches sharing the output directory do not remove each other's files
+    search_key = hashlib.sha1(f'{src_dir}|{extensions}|{recursive}|{keep_paths}|{shrink}'.encode('utf-8')).hexdigest()[:16]
+    return f'{out_dir}/{MANIFEST_DIR}/{search_key}.json'
+
+
+
+def is_up_to_date(in_file, file_size, file_mtime, out_file, entry, hash_files, link_mode='copy'):
+    # Destination must exist, must have been staged the requested way and must not have been touched since
+    if (entry is None) or (os.path.isfile(out_file) == False):
+        return False
+
+    # Every method chain ends with a copy, so the method used does not tell whether another link mode was requested since
+    if (entry.get('link_mode') != link_mode):
+        return False
+
+    out_stat = os.stat(out_file)
+    if (out_stat.st_size != entry['size']) or (out_stat.st_mtime_ns != entry['out_mtime']):
+        return False
+
+    if (file_size != entry['size']):
+        return False
+
+    if (file_mtime == entry['mtime']):
+        return True
+
+    # Source was touched, compare the content if requested
+    if (hash_files) and (entry.get('hash') is not None):
+        if (hash_file(in_file) == entry['hash']):
+            entry['mtime'] = file_mtime
+            return True
+
+    return False
+
+
+
+def format_progress(files_done, files_total, bytes_done, bytes_total, elapsed):
+    elapsed = max(elapsed, 1e-6)
+    bytes_rate = bytes_done / elapsed
+    eta = ((bytes_total - bytes_done) / bytes_rate) if (bytes_rate > 0) else 0
+
+    return f'{files_done}/{files_total} files, {files_done / elapsed:.1f} files/s, {bytes_rate / (1024 * 1024):.1f} MB/s, ETA {eta:.1f}s'
+
+
+
+def new_scan_index():
+    # Files found in every scanned directory (path, size, mtime) and the directories whose whole sub-tree is indexed
+    return {'dirs': dict(), 'complete': set()}
+
+
+
+@traced('scan_directory', 'src_dir')
+def scan_directory(scan_index, src_dir, recursive=False):
+    pending_dirs = [src_dir]
+    while (len(pending_dirs) > 0):
+        current_dir = pending_dirs.pop()
+        dir_files = []
+
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    # Reuse the data already provided by the directory listing
+                    if entry.is_file():
+                        entry_stat = entry.stat()
+                        dir_files.append([f'{current_dir}/{entry.name}', entry_stat.st_size, entry_stat.st_mtime_ns])
+                    elif (recursive) and (entry.is_dir(follow_symlinks=False)):
+                        pending_dirs.append(f'{current_dir}/{entry.name}')
+        except FileNotFoundError:
+            pass
+
+        scan_index['dirs'][current_dir] = dir_files
+        if (recursive):
+            scan_index['complete'].add(current_dir)
+
+
+
+def invalidate_scan_index(scan_index, src_dir):
+    # Forget a sub-tree that was written to, along with the marks of the directories whose complete scan included it
+    for dir_path in list(scan_index['dirs'].keys()):
+        if (dir_path == src_dir) or dir_path.startswith(f'{src_dir}/'):
+            del scan_index['dirs'][dir_path]
+    scan_index['complete'] = set(complete_dir for complete_dir in scan_index['complete']
+                                 if (complete_dir != src_dir) and (src_dir.startswith(f'{complete_dir}/') == False) and (complete_dir.startswith(f'{src_dir}/') == False))
+
+
+
+def query_scan_index(scan_index, src_dir, recursive=False):
+    if (scan_index is None):
+        scan_index = new_scan_index()
+
+    # Scan only if no previous scan covers the requested directory
+    covered = any([(src_dir == complete_dir) or src_dir.startswith(f'{complete_dir}/') for complete_dir in scan_index['complete']])
+    if (covered == False):
+        if (recursive) or (src_dir not in scan_index['dirs']):
+            scan_directory(scan_index, src_dir, recursive)
+
+    if (recursive == False):
+        return sorted(scan_index['dirs'].get(src_dir, []))
+
+    results = []
+    for [dir_path, dir_files] in scan_index['dirs'].items():
+        if (dir_path == src_dir) or dir_path.startswith(f'{src_dir}/'):
+            results += dir_files
+    return sorted(results)
+
+
+
+@traced('copy_files', 'src_dir')
+def copy_files(out_dir, clear=False, file=None, src_dir=None, extensions=None, recursive=False, keep_paths=False, shrink=False, ignore=False, incremental=False, hash_files=False, link_mode='copy', scan_index=None, copy_jobs=COPY_JOBS, verbose=False, log=print):
     # Update output and source directories to ensure they are using full system paths
     out_dir = Path(os.path.abspath(out_dir)).as_posix() if (out_dir is not None) else None
     src_dir = Path(os.path.abspath(src_dir)).as_posix() if (src_dir is not None) else None
@@ -31,6 +288,9 @@ def copy_files(out_dir, clear=False, file=None, src_dir=None, extensions=None, r
     if (file is not None) and (extensions is not None):
         raise SystemExit(f'ERROR: specify either -f (a file) or -e (file extensions), leaving...')
 
+    if (link_mode not in LINK_MODES):
+        raise SystemExit(f'ERROR: unknown link mode "{link_mode}", expected one of {", ".join(LINK_MODES.keys())}, leaving...')
+
     # Copy the single file if requested
     if (file is not None):
         if (os.path.isfile(file) == False):
@@ -48,7 +308,8 @@ def copy_files(out_dir, clear=False, file=None, src_dir=None, extensions=None, r
         final_dist = shutil.copy2(file, out_dir)
         
         # Log the result
-        print(f'File copy complete: finished copying {Path(file).as_posix()} to {Path(final_dist).as_posix()}')
+        log(f'File copy complete: finished copying {Path(file).as_posix()} to {Path(final_dist).as_posix()}')
+        trace_counters(files=1, bytes=os.path.getsize(final_dist))
         return
 
     # Copy multiple files based on the search results
@@ -60,40 +321,32 @@ def copy_files(out_dir, clear=False, file=None, src_dir=None, extensions=None, r
 
         files_to_copy = list()
         unique_file_names = dict()
-        for extension in extensions_list:
-            # Find all files            
-            if (recursive):
-                glob_results = Path(f'{src_dir}').rglob(f'*.{extension}')
+        # Suffixes are matched whole so that multi-dot extensions such as "tar.gz" still match
+        extensions_suffixes = tuple(set([f'.{extension.lower()}' if (os.name == 'nt') else f'.{extension}' for extension in extensions_list]))
+        for [in_file, file_size, file_mtime] in query_scan_index(scan_index, src_dir, recursive):
+            # Check the extension, if not requested, continue
+            file_name = os.path.basename(in_file)
+            if ((file_name.lower() if (os.name == 'nt') else file_name).endswith(extensions_suffixes) == False):
+                continue
+
+            # File path relative to the search directory if needed
+            relative_path = in_file.replace(src_dir, '')
+            if (keep_paths):
+                if (shrink):
+                    relative_path = relative_path.replace('/', '_')
+                out_file = Path(f'{out_dir}/{relative_path}').as_posix()
             else:
-                glob_results = Path(f'{src_dir}').glob(f'*.{extension}')
-                            
-            # Process all files
-            for in_file in glob_results:
-                in_file = Path(in_file).as_posix()
-                
-                # Check if file, if not, continue
-                if (os.path.isfile(in_file) == False):
-                    continue
-                
-                # File path relative to the search directory if needed
-                file_name = os.path.basename(in_file)
-                relative_path = in_file.replace(src_dir, '')
-                if (keep_paths):
-                    if (shrink):
-                        relative_path = relative_path.replace('/', '_')
-                    out_file = Path(f'{out_dir}/{relative_path}').as_posix()
-                else:
-                    out_file = Path(f'{out_dir}/{file_name}').as_posix()
-                
-                # Save the entry
-                files_to_copy.append([file_name, relative_path, in_file, out_file])
-                
-                # Keep the record of unique names to avoid overwritting under certain conditions
-                if (file_name in unique_file_names):
-                    if (keep_paths == False):
-                        raise SystemExit(f'ERROR: file "{file_name}" was found in multiple directories relative to {src_dir}, leaving...')
-                else:
-                    unique_file_names[file_name] = None
+                out_file = Path(f'{out_dir}/{file_name}').as_posix()
+            
+            # Save the entry
+            files_to_copy.append([file_name, relative_path, in_file, out_file, file_size, file_mtime])
+            
+            # Keep the record of unique names to avoid overwritting under certain conditions
+            if (file_name in unique_file_names):
+                if (keep_paths == False):
+                    raise SystemExit(f'ERROR: file "{file_name}" was found in multiple directories relative to {src_dir}, leaving...')
+            else:
+                unique_file_names[file_name] = None
 
         # Create new directory if needed
         if (clear):
@@ -102,98 +355,674 @@ def copy_files(out_dir, clear=False, file=None, src_dir=None, extensions=None, r
                     raise SystemExit(f'ERROR: output path "{out_dir}" is a file, leaving...')
                 shutil.rmtree(out_dir)
         Path(out_dir).mkdir(parents=True, exist_ok=True)
+
+        # Load the record of the previous staging into this directory
+        if (incremental):
+            manifest_file = manifest_path(out_dir, src_dir, extensions, recursive, keep_paths, shrink)
+            manifest = load_json_file(manifest_file, {'files': dict()})['files']
+        else:
+            manifest = dict()
         
         # Perform initial checks
-        for [file_name, relative_path, in_file, out_file] in files_to_copy:
+        for [file_name, relative_path, in_file, out_file, file_size, file_mtime] in files_to_copy:
             if (os.path.isdir(out_file)):
                 raise SystemExit(f'ERROR: output path "{out_file}" already exists and is a directory, leaving...')
             
-            if (os.path.isfile(out_file) and (ignore == False)):
+            if (os.path.isfile(out_file) and (ignore == False) and (out_file not in manifest)):
                 raise SystemExit(f'ERROR: output file "{out_file}" already exists, leaving...')
 
+        # Remove the outputs staged previously whose sources no longer exist
+        files_removed = []
+        if (incremental):
+            planned_files = set([out_file for [file_name, relative_path, in_file, out_file, file_size, file_mtime] in files_to_copy])
+            for out_file in list(manifest.keys()):
+                if (out_file not in planned_files):
+                    if (os.path.isfile(out_file)):
+                        os.remove(out_file)
+                        files_removed.append(out_file)
+                        log(f'PROGRESS: removed stale {out_file}')
+                    del manifest[out_file]
+
+        # Select the files that need to be staged
+        files_pending = []
+        files_skipped = []
+        for [file_name, relative_path, in_file, out_file, file_size, file_mtime] in files_to_copy:
+            if (incremental) and (is_up_to_date(in_file, file_size, file_mtime, out_file, manifest.get(out_file), hash_files, link_mode)):
+                files_skipped.append(relative_path)
+            else:
+                files_pending.append([file_name, relative_path, in_file, out_file, file_size, file_mtime])
+
+        # Create all output directories up front
+        for out_file_dir in sorted(set([os.path.dirname(out_file) for [file_name, relative_path, in_file, out_file, file_size, file_mtime] in files_pending])):
+            Path(out_file_dir).mkdir(parents=True, exist_ok=True)
+
         # Copy files
         files_copied = []
-        for [file_name, relative_path, in_file, out_file] in files_to_copy:
-            try:
-                Path(os.path.dirname(out_file)).mkdir(parents=True, exist_ok=True)
-                shutil.copyfile(in_file, out_file)
+        copy_errors = []
+        bytes_copied = 0
+        bytes_linked = 0
+        bytes_total = sum([file_size for [file_name, relative_path, in_file, out_file, file_size, file_mtime] in files_pending])
+        time_start = time.monotonic()
+        time_reported = time_start
+
+        with ThreadPoolExecutor(max_workers=max(1, copy_jobs)) as executor:
+            futures = {executor.submit(stage_pending_file, in_file, out_file, link_mode, incremental and hash_files): [file_name, relative_path, in_file, out_file, file_size, file_mtime]
+                       for [file_name, relative_path, in_file, out_file, file_size, file_mtime] in files_pending}
+
+            for future in as_completed(futures):
+                [file_name, relative_path, in_file, out_file, file_size, file_mtime] = futures[future]
+
+                try:
+                    [method, out_mtime, file_hash] = future.result()
+                except Exception as e:
+                    copy_errors.append(f'[src_dir]{relative_path}: {e}')
+                    continue
+
                 files_copied.append(relative_path)
-                print(f'PROGRESS: copied [src_dir]{relative_path} to {out_file}')
-            except Exception as e:
-                raise SystemExit(f'ERROR: could not copy [src_dir]{relative_path} due to the following error "{e}", leaving...')
+                if (method in LINKED_METHODS):
+                    bytes_linked += file_size
+                else:
+                    bytes_copied += file_size
+
+                if (incremental):
+                    manifest[out_file] = {'src':       in_file,
+                                          'size':      file_size,
+                                          'mtime':     file_mtime,
+                                          'out_mtime': out_mtime,
+                                          'method':    method,
+                                          'link_mode': link_mode,
+                                          'hash':      file_hash}
+
+                # Report either every file or a throttled aggregate
+                if (verbose):
+                    log(f'PROGRESS: copied [src_dir]{relative_path} to {out_file} ({method})')
+                elif ((time.monotonic() - time_reported) >= PROGRESS_INTERVAL):
+                    time_reported = time.monotonic()
+                    log(f'PROGRESS: {format_progress(len(files_copied), len(files_pending), bytes_copied + bytes_linked, bytes_total, time_reported - time_start)}')
+
+        trace_counters(files=len(files_copied), bytes=bytes_copied + bytes_linked)
+        if (incremental):
+            save_json_file(manifest_file, {'src_dir': src_dir, 'files': manifest})
+            log(f'File copy complete: finished copying {len(files_copied)} files ({len(files_skipped)} up to date, {len(files_removed)} stale removed)')
+        else:
+            log(f'File copy complete: finished copying {len(files_copied)} files')
+        log(f'                    {format_size(bytes_copied)} copied, {format_size(bytes_linked)} linked, {format_progress(len(files_copied), len(files_pending), bytes_copied + bytes_linked, bytes_total, time.monotonic() - time_start)}')
 
-        print(f'File copy complete: finished copying {len(files_copied)} files')
+        # Report all failures at once
+        if (len(copy_errors) > 0):
+            for copy_error in copy_errors:
+                log(f'ERROR: could not copy {copy_error}')
+            raise SystemExit(f'ERROR: could not copy {len(copy_errors)} of {len(files_pending)} files, leaving...')
         return
 
 
-    print(f'WARNING: leaving with no action performed')
+    log(f'WARNING: leaving with no action performed')
     return
 
 
 
-def process_project(args, project_name, test_proj):
-    print(f'Processing "{project_name}" project ...')
+def parse_test_results(file_path):
+    # Read the GoogleTest JSON report into {"Suite.Test": [duration, failed]}
+    results = dict()
+    if (os.path.isfile(file_path) == False):
+        return results
+
+    try:
+        with open(file_path, 'r') as file:
+            report = json.load(file)
+    except Exception:
+        return results
+
+    for test_suite in report.get('testsuites', []):
+        for test_case in test_suite.get('testsuite', []):
+            if (test_case.get('status', 'RUN') != 'RUN'):
+                continue
+            duration = float(f'{test_case.get("time", "0s")}'.rstrip('s') or 0)
+            failed = len(test_case.get('failures', [])) > 0
+            results[f'{test_suite["name"]}.{test_case["name"]}'] = [duration, failed]
+
+    return results
+
+
+
+def update_test_timings(timings, results):
+    timings['run'] += 1
+
+    for [test_name, [duration, failed]] in results.items():
+        entry = timings['tests'].setdefault(test_name, {'duration': duration, 'runs': 0, 'last_failed_run': None})
+
+        # Smooth the duration so that a single slow run does not reorder everything
+        entry['duration'] = (TIMINGS_ALPHA * duration) + ((1 - TIMINGS_ALPHA) * entry['duration'])
+        entry['runs'] += 1
+        if (failed):
+            entry['last_failed_run'] = timings['run']
+
+
+
+def recently_failed(timings, test_name):
+    entry = timings['tests'].get(test_name)
+    if (entry is None) or (entry['last_failed_run'] is None):
+        return False
+
+    return (timings['run'] - entry['last_failed_run']) < RECENT_FAILURE_RUNS
+
+
+
+def list_tests(executable_path, scratch_dir):
+    # Coverage counters written by the listing itself must not pollute the real ones
+    list_env = dict(os.environ)
+    list_env['GCOV_PREFIX'] = scratch_dir
+
+    list_result = run_process('test_list', [executable_path, '--gtest_list_tests'], label=os.path.basename(executable_path), capture_output=True, text=True, env=list_env)
+    if (list_result.returncode != 0):
+        return []
+
+    tests = []
+    test_suite = None
+    for line in list_result.stdout.splitlines():
+        line = line.split('#')[0].rstrip()
+        if (len(line) == 0):
+            continue
+        if (line.startswith(' ') == False):
+            test_suite = line.strip()
+        elif (test_suite is not None):
+            tests.append(f'{test_suite}{line.strip()}')
+
+    return tests
+
+
+
+def assign_test_shards(tests, timings, shard_count):
+    # Tests without history are expected to take as long as an average known test
+    known_durations = [entry['duration'] for entry in timings['tests'].values()]
+    default_duration = (sum(known_durations) / len(known_durations)) if (len(known_durations) > 0) else 1.0
+    durations = {test: timings['tests'][test]['duration'] if (test in timings['tests']) else default_duration for test in tests}
+
+    # Longest tests first, each one to the least loaded shard
+    shard_heap = [[0.0, shard_index] for shard_index in range(shard_count)]
+    shard_tests = [[] for shard_index in range(shard_count)]
+    for test in sorted(tests, key=lambda test: durations[test], reverse=True):
+        [load, shard_index] = heapq.heappop(shard_heap)
+        shard_tests[shard_index].append(test)
+        heapq.heappush(shard_heap, [load + durations[test], shard_index])
+
+    return [shard_tests, max([load for [load, shard_index] in shard_heap])]
+
+
+
+def plan_test_runs(args, executable_path, timings, runs_dir, log=print):
+    # Only list the tests when the history can change the default order or split
+    tests = []
+    if (len(timings['tests']) > 0) and ((args.shards > 1) or (args.fail_fast_first)):
+        tests = list_tests(executable_path, f'{runs_dir}/list')
+
+    phases = []
+    first_tests = [test for test in tests if recently_failed(timings, test)] if (args.fail_fast_first) else []
+    other_filter = dict()
+    if (len(first_tests) > 0):
+        log(f'...... running {len(first_tests)} recently failed tests first ...')
+        phases.append([{'name': 'first', 'env': {'GTEST_FILTER': ':'.join(first_tests)}}])
+        other_filter = {'GTEST_FILTER': '-' + ':'.join(first_tests)}
+
+    remaining_tests = [test for test in tests if (test not in first_tests)]
+    if (len(tests) > 0) and (len(remaining_tests) == 0):
+        return phases
+
+    if (args.shards == 1):
+        phases.append([{'name': 'all', 'env': other_filter}])
+        return phases
+
+    # Balance the shards using the recorded durations where the filters stay within the platform limits
+    if (len(remaining_tests) > 0):
+        [shard_tests, longest_shard] = assign_test_shards(remaining_tests, timings, args.shards)
+        if (all([len(':'.join(shard)) < MAX_FILTER_LENGTH for shard in shard_tests])):
+            log(f'...... scheduled {len(remaining_tests)} tests on {args.shards} shards, longest shard estimated at {longest_shard:.2f}s ...')
+            phases.append([{'name': f'shard_{shard_index}', 'env': {'GTEST_FILTER': ':'.join(shard)}} for [shard_index, shard] in enumerate(shard_tests) if (len(shard) > 0)])
+            return phases
+
+    phases.append([{'name': f'shard_{shard_index}', 'env': dict(other_filter, GTEST_TOTAL_SHARDS=f'{args.shards}', GTEST_SHARD_INDEX=f'{shard_index}')} for shard_index in range(args.shards)])
+    return phases
+
+
+
+def merge_run_coverage(args, project_name, runs_dir, run_names, log=print):
+    object_dir = f'{args.bin_dir}/{project_name}/CMakeFiles/{project_name}.dir'
+    object_subdir = f'{project_name}/CMakeFiles/{project_name}.dir'
+
+    # Sum the counters of all runs pairwise, starting from the first run
+    merged_dir = None
+    with open(f'{runs_dir}/merge_out.txt', 'w') as merge_output_file:
+        for run_name in run_names:
+            run_dir = f'{runs_dir}/{run_name}/{object_subdir}'
+            if (os.path.isdir(run_dir) == False):
+                continue
+            if (merged_dir is None):
+                merged_dir = run_dir
+                continue
+
+            output_dir = f'{runs_dir}/merged_{run_name}'
+            merge_result = run_process('gcov_tool', [args.gcov_tool, 'merge', '-o', output_dir, merged_dir, run_dir],
+                                       label=project_name,
+                                       stdout=merge_output_file,
+                                       stderr=subprocess.STDOUT)
+
+            if (merge_result.returncode != 0):
+                log(f'...... coverage merge ERROR, error log available at {merge_output_file.name} ...')
+                return -1
+            merged_dir = output_dir
+
+    if (merged_dir is None):
+        return 0
+
+    # Put the merged counters where a regular run would have left them
+    scan_index = new_scan_index()
+    for [in_file, file_size, file_mtime] in query_scan_index(scan_index, merged_dir, recursive=True):
+        if (in_file.endswith('.gcda')):
+            out_file = f'{object_dir}{in_file[len(merged_dir):]}'
+            Path(os.path.dirname(out_file)).mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(in_file, out_file)
+
+    return 0
+
+
+
+@traced('run_tests', 'project_name')
+def run_tests(args, project_name, executable_path, test_output_file, test_error_file, log=print):
+    runs_dir = f'{args.bin_dir}/{project_name}/test_runs'
+    if (os.path.exists(runs_dir)):
+        shutil.rmtree(runs_dir)
+    Path(runs_dir).mkdir(parents=True, exist_ok=True)
+
+    timings_file = f'{args.bin_dir}/{project_name}/{project_name}_test_timings.json'
+    timings = load_json_file(timings_file, {'run': 0, 'tests': dict()})
+    phases = plan_test_runs(args, executable_path, timings, runs_dir, log=log)
+
+    # Counters left by the previous run would add up with this one and keep every object from matching its cached coverage results
+    for [dir_path, dir_names, file_names] in os.walk(f'{args.bin_dir}/{project_name}/CMakeFiles/{project_name}.dir'):
+        for file_name in file_names:
+            if (file_name.endswith('.gcda')):
+                os.remove(f'{dir_path}/{file_name}')
+
+    # Strip the build directory from the object paths so that concurrent runs write their counters below their own prefix
+    use_prefix = (args.shards > 1)
+    prefix_strip = len(Path(args.bin_dir).parts) - 1
+
+    returncode = 0
+    results = dict()
+    run_names = []
+    for phase in phases:
+        # Start all runs of the phase at once, each with its own outputs
+        processes = []
+        for run in phase:
+            run_dir = f'{runs_dir}/{run["name"]}'
+            Path(run_dir).mkdir(parents=True, exist_ok=True)
+
+            run_env = dict(os.environ)
+            run_env.update(run['env'])
+            run_env['GTEST_OUTPUT'] = f'json:{run_dir}/{project_name}.json'
+            if (use_prefix):
+                run_env['GCOV_PREFIX']       = run_dir
+                run_env['GCOV_PREFIX_STRIP'] = f'{prefix_strip}'
+
+            run_output_file = open(f'{run_dir}/{project_name}_out.txt', 'w')
+            run_error_file  = open(f'{run_dir}/{project_name}_err.txt', 'w')
+            test_process = AccountedProcess('tests', [executable_path],
+                                            label=f'{project_name}/{run["name"]}',
+                                            stdout=run_output_file,
+                                            stderr=run_error_file,
+                                            env=run_env)
+            processes.append([run['name'], test_process, run_output_file, run_error_file])
+            run_names.append(run['name'])
+
+        # Wait for all runs and combine their outputs
+        for [run_name, test_process, run_output_file, run_error_file] in processes:
+            run_returncode = test_process.wait()
+            run_output_file.close()
+            run_error_file.close()
+
+            if (run_returncode != 0):
+                log(f'...... unit test run "{run_name}" ERROR, error log available at {run_error_file.name} ...')
+                returncode = run_returncode
+
+            for [run_file, test_file] in [[run_output_file, test_output_file], [run_error_file, test_error_file]]:
+                if (len(phases) > 1) or (len(phase) > 1):
+                    test_file.write(f'===== {run_name} =====\n')
+                with open(run_file.name, 'r') as file:
+                    shutil.copyfileobj(file, test_file)
+            test_output_file.flush()
+            test_error_file.flush()
+
+            results.update(parse_test_results(f'{runs_dir}/{run_name}/{project_name}.json'))
+
+        # Do not bother with the remaining tests once the first ones failed
+        if (returncode != 0):
+            break
+
+    if (len(results) > 0):
+        update_test_timings(timings, results)
+        save_json_file(timings_file, timings)
+
+    if (returncode != 0):
+        return returncode
+
+    if (use_prefix):
+        return merge_run_coverage(args, project_name, runs_dir, run_names, log=log)
+    return 0
+
+
+
+@traced('stage_coverage_metadata', 'project_name')
+def stage_coverage_metadata(args, project_name, scan_index=None, log=print):
+    object_dir   = f'{args.bin_dir}/{project_name}/CMakeFiles/{project_name}.dir'
+    metadata_dir = f'{args.bin_dir}/{project_name}/coverage_metadata'
+    scan_index   = scan_index if (scan_index is not None) else new_scan_index()
+
+    # Objects of the project sources sit at the top of the object directory, the shared sources below __/src,
+    # both keep their layout relative to the object directory so that equally named sources never collide
+    metadata_files = [[in_file, file_size, file_mtime] for [in_file, file_size, file_mtime] in query_scan_index(scan_index, object_dir, recursive=True)
+                      if ((os.path.dirname(in_file) == object_dir) or in_file.startswith(f'{object_dir}/__/src/')) and (os.path.splitext(in_file)[1] in ['.gcno', '.gcda'])]
+
+    if (os.path.exists(metadata_dir)):
+        if (os.path.isdir(metadata_dir) == False):
+            raise SystemExit(f'ERROR: output path "{metadata_dir}" is a file, leaving...')
+        shutil.rmtree(metadata_dir)
+
+    for out_file_dir in sorted(set([os.path.dirname(f'{metadata_dir}{in_file[len(object_dir):]}') for [in_file, file_size, file_mtime] in metadata_files])):
+        Path(out_file_dir).mkdir(parents=True, exist_ok=True)
+    Path(metadata_dir).mkdir(parents=True, exist_ok=True)
+
+    # The staged files are recorded in the index as they are written, so that the report does not scan the staging directory again
+    invalidate_scan_index(scan_index, metadata_dir)
+    staged_dirs = dict()
+    bytes_copied = 0
+    bytes_linked = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.copy_jobs)) as executor:
+        futures = {executor.submit(stage_file, in_file, f'{metadata_dir}{in_file[len(object_dir):]}', args.coverage_link): [in_file, file_size, file_mtime] for [in_file, file_size, file_mtime] in metadata_files}
+
+        for future in as_completed(futures):
+            [in_file, file_size, file_mtime] = futures[future]
+            out_file = f'{metadata_dir}{in_file[len(object_dir):]}'
+            try:
+                method = future.result()
+            except Exception as e:
+                raise SystemExit(f'ERROR: could not stage {in_file} due to the following error "{e}", leaving...')
+
+            if (method in LINKED_METHODS):
+                bytes_linked += file_size
+            else:
+                bytes_copied += file_size
+
+            # Hard and symbolic links share the time stamp of their source, copies and reflinks get their own
+            out_mtime = file_mtime if (method in ['hardlink', 'symlink']) else os.stat(out_file).st_mtime_ns
+            staged_dirs.setdefault(os.path.dirname(out_file), []).append([out_file, file_size, out_mtime])
+
+            if (args.verbose):
+                log(f'PROGRESS: staged {in_file} to {metadata_dir}{in_file[len(object_dir):]} ({method})')
+
+    for dir_path in set([metadata_dir] + list(staged_dirs.keys())):
+        scan_index['dirs'][dir_path] = staged_dirs.get(dir_path, [])
+        while (dir_path != metadata_dir):
+            dir_path = os.path.dirname(dir_path)
+            scan_index['dirs'].setdefault(dir_path, [])
+    scan_index['complete'].add(metadata_dir)
+
+    trace_counters(files=len(metadata_files), bytes=bytes_copied + bytes_linked)
+    log(f'File staging complete: finished staging {len(metadata_files)} files, {format_size(bytes_copied)} copied, {format_size(bytes_linked)} linked (I/O avoided)')
+
+
+
+def gcovr_command(args):
+    command_args = ['gcovr',
+                    '--root', './src']
+
+    if (args.mode == 'clang'):
+        command_args = command_args + ['--gcov-executable', 'llvm-cov gcov']
+
+    return command_args
+
+
+
+def fingerprint_coverage_object(gcno_file, gcda_file):
+    object_hash = hashlib.sha1()
+    for file_path in [gcno_file, gcda_file]:
+        object_hash.update(b'|')
+        if (file_path is not None):
+            with open(file_path, 'rb') as file:
+                for byte_block in iter(lambda: file.read(1024 * 1024), b""):
+                    object_hash.update(byte_block)
+
+    return object_hash.hexdigest()
+
+
+
+@traced('trace_coverage_batch', 'batch_name')
+def trace_coverage_batch(args, batch_name, batch, work_dir, tracefile):
+    # Give gcovr a directory holding nothing but the objects of this batch, laid out like the metadata directory
+    if (os.path.exists(work_dir)):
+        shutil.rmtree(work_dir)
+    Path(work_dir).mkdir(parents=True, exist_ok=True)
+
+    for [object_name, gcno_file, gcda_file] in batch:
+        for [file_path, extension] in [[gcno_file, '.gcno'], [gcda_file, '.gcda']]:
+            if (file_path is not None):
+                Path(os.path.dirname(f'{work_dir}/{object_name}')).mkdir(parents=True, exist_ok=True)
+                stage_file(file_path, f'{work_dir}/{object_name}{extension}', args.coverage_link)
+
+    with open(f'{work_dir}.log', 'w') as trace_log_file:
+        trace_result = run_process('gcovr', gcovr_command(args) + ['--json', tracefile, '--object-directory', work_dir],
+                                   label=f'{batch_name} ({len(batch)} objects)',
+                                   stdout=trace_log_file,
+                                   stderr=subprocess.STDOUT)
+
+    shutil.rmtree(work_dir)
+    return [batch_name, trace_result.returncode, trace_log_file.name]
+
+
+
+def sync_report_files(src_dir, out_dir):
+    # Only replace the files whose content changed and drop the files that are no longer generated
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    pages_updated = 0
+
+    generated_pages = set(os.listdir(src_dir))
+    for page in os.listdir(out_dir):
+        if (page not in generated_pages) and (os.path.isfile(f'{out_dir}/{page}')):
+            os.remove(f'{out_dir}/{page}')
+
+    for page in generated_pages:
+        if (os.path.isfile(f'{out_dir}/{page}')) and (os.path.getsize(f'{out_dir}/{page}') == os.path.getsize(f'{src_dir}/{page}')):
+            if (hash_file(f'{out_dir}/{page}') == hash_file(f'{src_dir}/{page}')):
+                continue
+        os.replace(f'{src_dir}/{page}', f'{out_dir}/{page}')
+        pages_updated += 1
+
+    return pages_updated
+
+
+
+@traced('generate_coverage_report', 'project_name')
+def generate_coverage_report(args, project_name, scan_index=None, log=print):
+    metadata_dir = f'{args.bin_dir}/{project_name}/coverage_metadata'
+    cache_dir    = f'{args.bin_dir}/{project_name}/coverage_cache'
+    report_dir   = f'{args.out_dir}/coverage_report/{project_name}'
+    formats      = [s.strip() for s in args.coverage_format.split(',') if (len(s) > 0)]
+
+    # Group the metadata into objects, every object being a gcno file with its optional gcda counterpart
+    objects = dict()
+    for [in_file, file_size, file_mtime] in query_scan_index(scan_index, metadata_dir, recursive=True):
+        [object_name, extension] = os.path.splitext(in_file[len(metadata_dir) + 1:])
+        if (extension in ['.gcno', '.gcda']):
+            objects.setdefault(object_name, {'.gcno': None, '.gcda': None})[extension] = in_file
+
+    # Results depend on the gcov flavour too, a different one invalidates the whole cache
+    signature = ' '.join(gcovr_command(args))
+    manifest_file = f'{cache_dir}/manifest.json'
+    manifest = load_json_file(manifest_file, dict())
+    if (manifest.get('signature') != signature):
+        manifest = {'signature': signature, 'objects': dict()}
+        if (os.path.exists(f'{cache_dir}/objects')):
+            shutil.rmtree(f'{cache_dir}/objects')
+
+    fingerprints = dict()
+    objects_changed = set()
+    for [object_name, object_files] in objects.items():
+        if (object_files['.gcno'] is None):
+            continue
+        fingerprints[object_name] = fingerprint_coverage_object(object_files['.gcno'], object_files['.gcda'])
+        entry = manifest['objects'].get(object_name)
+        if (entry is None) or (entry['fingerprint'] != fingerprints[object_name]) or (os.path.isfile(entry['tracefile']) == False):
+            objects_changed.add(object_name)
+
+    # Objects are traced in batches sharing one tracefile, a changed or removed object invalidates the tracefile of its whole batch
+    objects_removed = [object_name for object_name in manifest['objects'].keys() if (object_name not in fingerprints)]
+    invalid_tracefiles = set(manifest['objects'][object_name]['tracefile'] for object_name in list(objects_changed) + objects_removed if (object_name in manifest['objects']))
+    pending = sorted(object_name for object_name in fingerprints.keys() if (object_name in objects_changed) or (manifest['objects'][object_name]['tracefile'] in invalid_tracefiles))
+
+    for object_name in objects_removed + pending:
+        manifest['objects'].pop(object_name, None)
+    for tracefile in invalid_tracefiles:
+        if (os.path.isfile(tracefile)):
+            os.remove(tracefile)
+
+    log(f'...... {len(objects_changed)} objects changed, {len(fingerprints) - len(pending)} reused from cache, {len(objects_removed)} removed')
+
+    # Neighbouring objects share a batch, which stays small enough that one changed object does not retrace too much, while every core gets one
+    batch_count = min(len(pending), max(os.cpu_count() or 1, -(-len(pending) // COVERAGE_BATCH_SIZE)))
+    batches = [pending[batch_index * len(pending) // batch_count:(batch_index + 1) * len(pending) // batch_count] for batch_index in range(batch_count)]
+
+    Path(f'{cache_dir}/objects').mkdir(parents=True, exist_ok=True)
+    trace_errors = []
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        futures = dict()
+        for batch in batches:
+            batch_name = f'batch_{hashlib.sha1("|".join(batch).encode("utf-8")).hexdigest()[:16]}'
+            tracefile = f'{cache_dir}/objects/{batch_name}.json'
+            batch_objects = [[object_name, objects[object_name]['.gcno'], objects[object_name]['.gcda']] for object_name in batch]
+            futures[executor.submit(trace_coverage_batch, args, batch_name, batch_objects, f'{cache_dir}/work/{batch_name}', tracefile)] = [batch, tracefile]
+
+        for future in as_completed(futures):
+            [batch, tracefile] = futures[future]
+            [batch_name, returncode, trace_log] = future.result()
+            if (returncode == 0):
+                manifest['objects'].update({object_name: {'fingerprint': fingerprints[object_name], 'tracefile': tracefile} for object_name in batch})
+            else:
+                trace_errors.append(f'{batch_name} of {len(batch)} objects starting with {batch[0]} (log: {trace_log})')
+
+    save_json_file(manifest_file, manifest)
+
+    if (len(trace_errors) > 0):
+        with open(f'{args.bin_dir}/{project_name}/{project_name}_gcovr_err.txt', 'w') as coverage_error_file:
+            coverage_error_file.write('\n'.join([f'ERROR: gcovr failed for {trace_error}' for trace_error in trace_errors]))
+        return [-1, []]
+
+    if (len(manifest['objects']) == 0):
+        log(f'WARNING: no coverage metadata found in {metadata_dir}, leaving with no report generated')
+        return [0, []]
+
+    # Combine the per-object results into the requested outputs, written aside first so that only the changed files get replaced
+    staging_dir = f'{cache_dir}/report'
+    if (os.path.exists(staging_dir)):
+        shutil.rmtree(staging_dir)
+    Path(staging_dir).mkdir(parents=True, exist_ok=True)
+
+    # Only the tracefiles of the current objects are combined, whatever else is left in the cache
+    command_args = gcovr_command(args) + ['--verbose']
+    for tracefile in sorted(set(entry['tracefile'] for entry in manifest['objects'].values())):
+        command_args = command_args + ['--add-tracefile', tracefile]
+    outputs = []
+    if ('html' in formats):
+        command_args = command_args + ['--html', '--html-details', '--output', f'{staging_dir}/coverage_report.html']
+        command_args = command_args + ['--html-title', 'Clang Code Coverage Report' if (args.mode == 'clang') else 'GCC Code Coverage Report']
+        outputs.append(f'{report_dir}/coverage_report.html')
+    if ('json' in formats):
+        command_args = command_args + ['--json-summary-pretty', '--json-summary', f'{staging_dir}/coverage_summary.json']
+        outputs.append(f'{report_dir}/coverage_summary.json')
+    if ('cobertura' in formats):
+        command_args = command_args + ['--cobertura', f'{staging_dir}/coverage_cobertura.xml']
+        outputs.append(f'{report_dir}/coverage_cobertura.xml')
+
+    with open(f'{args.bin_dir}/{project_name}/{project_name}_gcovr_out.txt', 'w') as coverage_output_file:
+        with open(f'{args.bin_dir}/{project_name}/{project_name}_gcovr_err.txt', 'w') as coverage_error_file:
+            coverage_result = run_process('gcovr_report', command_args,
+                                          label=project_name,
+                                          stdout=coverage_output_file,
+                                          stderr=coverage_error_file)
+
+    if (coverage_result.returncode != 0):
+        return [coverage_result.returncode, []]
+
+    files_updated = sync_report_files(staging_dir, report_dir)
+    log(f'...... {files_updated} report files updated')
+
+    return [0, outputs]
+
+
+
+@traced('process_project', 'project_name')
+def process_project(args, project_name, test_proj, scan_index=None, log=print):
+    log(f'Processing "{project_name}" project ...')
+    scan_index = scan_index if (scan_index is not None) else new_scan_index()
 
     # Copying all the generated binaries and report files
-    print(f'... copying the binaries ...')
-    copy_files(out_dir=args.out_dir, src_dir=f'{args.bin_dir}/{project_name}', extensions='exe,dll,pdb')
+    log(f'... copying the binaries ...')
+    copy_files(out_dir=args.out_dir, src_dir=f'{args.bin_dir}/{project_name}', extensions='exe,dll,pdb', scan_index=scan_index, incremental=args.incremental, hash_files=args.hash, link_mode=args.link, copy_jobs=args.copy_jobs, verbose=args.verbose, log=log)
     
-    if (test_proj) and (args.coverage):
+    if (test_proj) and (args.coverage) and (project_name in args.unaffected_tests):
+        log(f'... tests not affected by the changes, previous results kept ...')
+
+    elif (test_proj) and (args.coverage) and (args.copy_only == False):
         # Execute the unit test to generate coverage metadata
-        print(f'... executing the coverage binaries ...')
+        log(f'... executing the coverage binaries ...')
         with open(f'{args.bin_dir}/{project_name}/{project_name}_out.txt', 'w') as test_output_file:
             with open(f'{args.bin_dir}/{project_name}/{project_name}_err.txt', 'w') as test_error_file:
                 executable_path = f'{args.bin_dir}/{project_name}/{project_name}.exe'
                 if (os.path.exists(executable_path) == False):
-                    print(f'WARNING: executable {executable_path} could not be found, leaving with no action performed')
-                    return
-                test_result = subprocess.run([executable_path],
-                                              stdout=test_output_file,
-                                              stderr=test_error_file)
-
-                if (test_result.returncode != 0):
-                    print(f'...... unit test ERROR, error log available at {test_error_file.name} ...')
-                    exit(-1)
+                    log(f'WARNING: executable {executable_path} could not be found, leaving with no action performed')
+                    return 0
+                test_returncode = run_tests(args, project_name, executable_path, test_output_file, test_error_file, log=log)
+
+                if (test_returncode != 0):
+                    log(f'...... unit test ERROR, error log available at {test_error_file.name} ...')
+                    return -1
+
+        # The test run replaced the counters, whatever the index knew about the object directory is stale
+        invalidate_scan_index(scan_index, f'{args.bin_dir}/{project_name}/CMakeFiles/{project_name}.dir')
             
-        # Copy all RELEVANT coverage metadata files to the buffer directory
-        print(f'... copying coverage metadata ...')
-        copy_files(out_dir=f'{args.bin_dir}/{project_name}/coverage_metadata', src_dir=f'{args.bin_dir}/{project_name}/CMakeFiles/{project_name}.dir/',        clear=True, recursive=False, keep_paths=True, shrink=False, extensions='gcno,gcda')
-        copy_files(out_dir=f'{args.bin_dir}/{project_name}/coverage_metadata', src_dir=f'{args.bin_dir}/{project_name}/CMakeFiles/{project_name}.dir/__/src/', clear=True, recursive=True,  keep_paths=True, shrink=False, extensions='gcno,gcda')
+        # Link all RELEVANT coverage metadata files into the buffer directory, the object directory is scanned once as the test run produced new files
+        log(f'... staging coverage metadata ...')
+        stage_coverage_metadata(args, project_name, scan_index=scan_index, log=log)
         
         # Generate coverage report
-        print(f'... generating coverage report ...')
-        with open(f'{args.bin_dir}/{project_name}/{project_name}_gcovr_out.txt', 'w') as coverage_output_file:
-            with open(f'{args.bin_dir}/{project_name}/{project_name}_gcovr_err.txt', 'w') as coverage_error_file:
-                Path(f'{args.out_dir}/coverage_report').mkdir(parents=True, exist_ok=True)
-                
-                command_args = ['gcovr',
-                                '--verbose',
-                                '--root', './src',
-                                '--html', '--html-details',
-                                '--output', f'{args.out_dir}/coverage_report/coverage_report.html',
-                                '--object-directory', f'{args.bin_dir}/{project_name}/coverage_metadata',]
-                
-                if (args.mode == 'clang'):
-                    command_args = command_args + ['--html-title', '"Clang Code Coverage Report"']
-                    command_args = command_args + ['--gcov-executable', '"llvm-cov gcov"']
-                else:
-                    command_args = command_args + ['--html-title', '"GCC Code Coverage Report"']
-                          
-                command = ' '.join(command_args)
-                
-                coverage_result = subprocess.run(command,
-                                                 stdout=coverage_output_file,
-                                                 stderr=coverage_error_file)
-                                
-                if (coverage_result.returncode == 0):
-                    print(f'...... generation OK')
-                    print(f'               unit test output: {test_output_file.name}')
-                    print(f'                         report: {args.out_dir}/coverage_report/coverage_report.html')
-                else:
-                    print(f'...... generation ERROR, error log available at {coverage_error_file.name} ...')
+        log(f'... generating coverage report ...')
+        [coverage_returncode, coverage_outputs] = generate_coverage_report(args, project_name, scan_index=scan_index, log=log)
+
+        if (coverage_returncode == 0):
+            log(f'...... generation OK')
+            log(f'               unit test output: {args.bin_dir}/{project_name}/{project_name}_out.txt')
+            for coverage_output in coverage_outputs:
+                log(f'                         report: {coverage_output}')
+        else:
+            log(f'...... generation ERROR, error log available at {args.bin_dir}/{project_name}/{project_name}_gcovr_err.txt ...')
         
-    print(f'... DONE')
-    pass
+    log(f'... DONE')
+    return 0
+
+
+
+def process_project_buffered(args, project_name, test_proj, scan_index=None):
+    # Collect the log lines of the project so that they can be printed as a single block once the project is processed
+    log_lines = []
+
+    try:
+        status = process_project(args, project_name, test_proj, scan_index=scan_index, log=log_lines.append)
+    except SystemExit as e:
+        log_lines.append(f'{e.code}')
+        status = -1
+    except Exception as e:
+        log_lines.append(f'ERROR: processing of "{project_name}" failed with the following error "{e}", leaving...')
+        status = -1
+
+    return status, log_lines
 
 
 
@@ -203,47 +1032,116 @@ def process_project(args, project_name, test_proj):
 
 
 
-# Define argument parser
-parser = argparse.ArgumentParser(
-                    prog='File search and copy helper script.',
-                    description='Copies either a single file, or multiple files by search (either by extensions or glob query).')
+def main(argv=None, state=None):
+    # Every stage can be run in-process, the state carries indexes and caches from one stage to the next
+    state = state if (state is not None) else dict()
 
-parser.add_argument('-m', '--mode',       action='store',      required=True,  help='Indicate usage mode and whether the code is compiled by Clang or GCC, but not both. Applied to all projects.')
-parser.add_argument('-o', '--out_dir',    action='store',      required=True,  help='Output directory')
-parser.add_argument('-b', '--bin_dir',    action='store',      required=True,  help='Output of all generated files for the build (equivalent to CMAKE_CURRENT_BINARY_DIR)')
-parser.add_argument('-p', '--proj',       action='store',      required=False, help='Comma-separated projects in the build')
-parser.add_argument('-t', '--test_proj',  action='store',      required=False, help='Comma-separated test projects in the build')
-parser.add_argument('-c', '--coverage',   action='store_true', required=False, help='Attempt to perform coverage analysis on the test projects')
+    # Define argument parser
+    parser = argparse.ArgumentParser(
+                        prog='File search and copy helper script.',
+                        description='Copies either a single file, or multiple files by search (either by extensions or glob query).')
 
-args = parser.parse_args()
+    parser.add_argument('-m', '--mode',        action='store',      required=True,  help='Indicate usage mode and whether the code is compiled by Clang or GCC, but not both. Applied to all projects.')
+    parser.add_argument('-o', '--out_dir',     action='store',      required=True,  help='Output directory')
+    parser.add_argument('-b', '--bin_dir',     action='store',      required=True,  help='Output of all generated files for the build (equivalent to CMAKE_CURRENT_BINARY_DIR)')
+    parser.add_argument('-p', '--proj',        action='store',      required=False, help='Comma-separated projects in the build')
+    parser.add_argument('-t', '--test_proj',   action='store',      required=False, help='Comma-separated test projects in the build')
+    parser.add_argument('-c', '--coverage',    action='store_true', required=False, help='Attempt to perform coverage analysis on the test projects')
+    parser.add_argument('-i', '--incremental', action='store_true', required=False, help='Keep the output directory and only copy the binaries that changed since the previous run')
+    parser.add_argument('--hash',              action='store_true', required=False, help='Compare content hashes of touched binaries in incremental mode before copying them again')
+    parser.add_argument('--clean',             action='store_true', required=False, help='Force a full rebuild of the output directory, even in incremental mode')
+    parser.add_argument('-l', '--link',        action='store',      required=False, default='copy', choices=LINK_MODES.keys(), help='How the files are staged: copy, auto, hardlink, reflink, copy_file_range, symlink or link (falls back to copying when unsupported)')
+    parser.add_argument('--coverage_link',     action='store',      required=False, default='link', choices=LINK_MODES.keys(), help='How the coverage metadata is staged for gcovr (link tries hardlinks, reflinks and symlinks before copying)')
+    parser.add_argument('--copy_jobs',         action='store',      required=False, type=int, default=COPY_JOBS, help='Number of files copied concurrently within a project')
+    parser.add_argument('-v', '--verbose',     action='store_true', required=False, help='Log every copied file instead of aggregated progress')
+    parser.add_argument('-s', '--shards',      action='store',      required=False, type=int, default=1, help='Number of parallel shards the coverage test binary is split into (GoogleTest sharding)')
+    parser.add_argument('--gcov_tool',         action='store',      required=False, default='gcov-tool', help='Tool used to merge the coverage counters of the shards')
+    parser.add_argument('--fail_fast_first',   action='store_true', required=False, help='Run the recently failed tests before all other tests and stop if they still fail')
+    parser.add_argument('--coverage_format',   action='store',      required=False, default='html', help='Comma-separated coverage outputs: html (detailed pages), json (summary) and/or cobertura')
+    parser.add_argument('--copy_only',         action='store_true', required=False, help='Only stage the binaries, without running the tests or generating coverage')
+    parser.add_argument('--changed',           action='store',      required=False, help='Comma-separated changed files, or "auto" for the changes since the previous run, unaffected test projects are skipped in incremental mode')
+    parser.add_argument('--trace',             action='store',      required=False, default=os.environ.get(TRACE_ENVIRONMENT), help='Write a Chrome trace of the timed steps to this file and print a summary table at the end')
+    parser.add_argument('--run_report',        action='store',      required=False, default=os.environ.get(REPORT_ENVIRONMENT), help='Append the wall time, CPU time, peak memory and I/O of every child process to this JSON report and print a summary per step')
+    parser.add_argument('--time_limit',        action='store',      required=False, help='Time limit in seconds of every child process, or comma-separated step=seconds pairs (tests, test_list, gcov_tool, gcovr, gcovr_report), exceeding children are stopped')
+    parser.add_argument('--memory_limit',      action='store',      required=False, help='Address space limit in MB of every child process, or comma-separated step=MB pairs (Linux only)')
+    parser.add_argument('-j', '--jobs',        action='store',      required=False, type=int, default=1, help='Number of projects processed in parallel (0 uses all available cores)')
 
-args.out_dir = Path(os.path.abspath(args.out_dir)).as_posix() if (args.out_dir is not None) else None
-args.bin_dir = Path(os.path.abspath(args.bin_dir)).as_posix() if (args.bin_dir is not None) else None
+    args = parser.parse_args(argv)
+    enable_tracing(args.trace)
+    enable_run_report(args.run_report, 'post_build', args.time_limit, args.memory_limit)
 
+    args.out_dir = Path(os.path.abspath(args.out_dir)).as_posix() if (args.out_dir is not None) else None
+    args.bin_dir = Path(os.path.abspath(args.bin_dir)).as_posix() if (args.bin_dir is not None) else None
 
-if (args.mode != 'gcc') and (args.mode != 'clang'):
-    raise SystemExit(f'ERROR: specify only one usage mode, either "clang" or "gcc", leaving...')
-    
-    
-project_list      = [s.strip() for s in args.proj.split(',')      if (len(s) > 0)]
-test_project_list = [s.strip() for s in args.test_proj.split(',') if (len(s) > 0)]
 
+    if (args.mode != 'gcc') and (args.mode != 'clang'):
+        raise SystemExit(f'ERROR: specify only one usage mode, either "clang" or "gcc", leaving...')
+
+
+    project_list      = [s.strip() for s in args.proj.split(',')      if (len(s) > 0)]
+    test_project_list = [s.strip() for s in args.test_proj.split(',') if (len(s) > 0)]
+
+
+    # Clean the output directory, unless only the changes are staged
+    if os.path.exists(args.out_dir) and ((args.incremental == False) or (args.clean)):
+        if (os.path.isdir(args.out_dir) == False):
+            raise SystemExit(f'ERROR: output path "{args.out_dir}" is a file, leaving...')
+        shutil.rmtree(args.out_dir)
+    Path(args.out_dir).mkdir(parents=True, exist_ok=True)
+
+
+    projects_to_process = [[project, False] for project in project_list] + [[project, True] for project in test_project_list]
+    jobs = os.cpu_count() if (args.jobs == 0) else args.jobs
+
+    if (jobs < 0):
+        raise SystemExit(f'ERROR: number of jobs must not be negative, leaving...')
+
+    if (args.shards < 1):
+        raise SystemExit(f'ERROR: number of shards must be positive, leaving...')
+
+
+    # Test projects the changes cannot reach keep their previous results, which only survive in incremental mode
+    args.unaffected_tests = set()
+    if (args.changed is not None):
+        impact = affected_by_changes(args.bin_dir, args.changed, 'post_build', test_project_list, state=state)
+        if (impact is not None) and (len(impact['unknown']) == 0) and (args.incremental) and (args.clean == False):
+            args.unaffected_tests = set(test_project_list) - set(impact['tests'])
+
+
+    # One index per project, each only touched by the thread processing it, shared by all the steps of the project in this run;
+    # a daemon keeps the state between builds which relink the binaries, so the indexes never outlive the run
+    scan_indexes = state['scan_indexes'] = {project: new_scan_index() for [project, test_proj] in projects_to_process}
+
+    if (jobs == 1):
+        for [project, test_proj] in projects_to_process:
+            if (process_project(args, project, test_proj, scan_index=scan_indexes[project]) != 0):
+                return -1
+    else:
+        failed_projects = []
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(process_project_buffered, args, project, test_proj, scan_indexes[project]): project for [project, test_proj] in projects_to_process}
+
+            # Print the log of every project as a whole once it is processed to keep the console output readable
+            for future in as_completed(futures):
+                status, log_lines = future.result()
+                print('\n'.join(log_lines))
+
+                if (status != 0):
+                    failed_projects.append(futures[future])
+
+        if (len(failed_projects) > 0):
+            print(f'ERROR: failed to process the following projects: {", ".join(failed_projects)}')
+            return -1
 
-# Clean the output directory
-if os.path.exists(args.out_dir):
-    if (os.path.isdir(args.out_dir) == False):
-        raise SystemExit(f'ERROR: output path "{args.out_dir}" is a file, leaving...')
-    shutil.rmtree(args.out_dir)
-Path(args.out_dir).mkdir(parents=True, exist_ok=True)
 
+    if (args.changed is not None):
+        acknowledge_changes(args.bin_dir, 'post_build', state)
 
-for project in project_list:
-    process_project(args, project, test_proj=False)
 
+    print(f'COMPLETE: Finished processing projects')
+    return 0
 
-for project in test_project_list:
-    process_project(args, project, test_proj=True)
 
 
-print(f'COMPLETE: Finished processing projects')
-exit(0)
\ No newline at end of file
+if (__name__ == '__main__'):
+    sys.exit(main())
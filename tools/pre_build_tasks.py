@@ -8,11 +8,32 @@
 
 
 
+import os
+import re
 import sys
+import json
+import shlex
+import shutil
+import time
+import heapq
+import hashlib
 import tempfile
 import argparse
 import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .include_graph import normalize_path, affected_by_changes, acknowledge_changes
+    from .json_files import load_json_file, save_json_file
+    from .tracing import TRACE_ENVIRONMENT, traced, trace_counters, enable_tracing
+    from .run_report import REPORT_ENVIRONMENT, AccountedProcess, run_process, enable_run_report
+except ImportError:
+    from include_graph import normalize_path, affected_by_changes, acknowledge_changes
+    from json_files import load_json_file, save_json_file
+    from tracing import TRACE_ENVIRONMENT, traced, trace_counters, enable_tracing
+    from run_report import REPORT_ENVIRONMENT, AccountedProcess, run_process, enable_run_report
 
 
 
@@ -22,56 +43,339 @@ from pathlib import Path
 
 
 
-def execute_iwyu(args):
+def hash_file(file_path, hash_cache=None):
+    # A warm cache (kept by the daemon between builds) only hashes files whose size or time stamp moved
+    if (hash_cache is not None):
+        file_stat = os.stat(file_path)
+        entry = hash_cache.get(file_path)
+        if (entry is not None) and (entry[0] == file_stat.st_size) and (entry[1] == file_stat.st_mtime_ns):
+            return entry[2]
+
+    with open(file_path, 'rb') as file:
+        file_hash = hashlib.file_digest(file, 'sha256').hexdigest()
+
+    if (hash_cache is not None):
+        hash_cache[file_path] = [file_stat.st_size, file_stat.st_mtime_ns, file_hash]
+    return file_hash
+
+
+
+def find_tool(explicit_path, candidates):
+    # Explicit paths win, otherwise the first candidate found on PATH is used
+    if (explicit_path is not None):
+        return explicit_path
+
+    for candidate in candidates:
+        tool_path = shutil.which(candidate)
+        if (tool_path is not None):
+            return tool_path
+
+    return None
+
+
+
+def find_fix_includes(args, iwyu_path):
+    if (args.fix_includes is not None):
+        return args.fix_includes
+
+    # The script is installed either on PATH or next to the analyser, under its upstream or its distribution name
+    for candidate in ['fix_includes.py', 'iwyu-fix-includes', 'fix_include']:
+        tool_path = shutil.which(candidate)
+        if (tool_path is None) and (iwyu_path is not None) and (os.path.isfile(f'{os.path.dirname(iwyu_path)}/{candidate}')):
+            tool_path = f'{os.path.dirname(iwyu_path)}/{candidate}'
+        if (tool_path is not None):
+            return Path(tool_path).as_posix()
+
+    return None
+
+
+
+def iwyu_command(entry, iwyu_path, mapping_file, deps_file):
+    command = entry['arguments'] if ('arguments' in entry) else shlex.split(entry['command'], posix=(os.name != 'nt'))
+
+    # The compiler is replaced by the analyser and the dependencies are written where the cache expects them
+    iwyu_arguments = [iwyu_path]
+    skip_next = False
+    for argument in command[1:]:
+        if (skip_next):
+            skip_next = False
+        elif (argument in ['-MF', '-MT', '-MQ']):
+            skip_next = True
+        elif (argument not in ['-MD', '-MMD']):
+            iwyu_arguments.append(argument)
+
+    iwyu_arguments += ['-MD', '-MF', deps_file]
+    if (mapping_file is not None):
+        iwyu_arguments += ['-Xiwyu', f'--mapping_file={Path(mapping_file).absolute().as_posix()}']
+
+    return iwyu_arguments
+
+
+
+def read_deps_file(deps_file):
+    with open(deps_file, 'r') as file:
+        content = file.read().replace('\\\n', ' ')
+
+    # Make syntax: the target, then a colon followed by whitespace, then the escaped dependency paths
+    dependencies = []
+    for line in content.splitlines():
+        separator = line.find(': ')
+        if (separator < 0):
+            continue
+        for dependency in line[separator + 2:].replace('\\ ', '\0').split():
+            dependencies.append(dependency.replace('\0', ' ').replace('$$', '$'))
+
+    return dependencies
+
+
+
+def iwyu_entry_valid(entry, command_hash, file_hashes, hash_cache=None):
+    if (entry is None) or (entry.get('command') != command_hash):
+        return False
+
+    for [dependency, dependency_hash] in entry['dependencies'].items():
+        if (dependency not in file_hashes):
+            file_hashes[dependency] = hash_file(dependency, hash_cache) if (os.path.isfile(dependency)) else None
+        if (file_hashes[dependency] != dependency_hash):
+            return False
+
+    return True
+
+
+
+@traced('analyse_translation_unit')
+def analyse_translation_unit(entry, iwyu_path, mapping_file, deps_dir):
+    source_file = Path(os.path.join(entry['directory'], entry['file'])).absolute().as_posix()
+    deps_file = f'{deps_dir}/{hashlib.sha1(source_file.encode()).hexdigest()}.d'
+    command = iwyu_command(entry, iwyu_path, mapping_file, deps_file)
+
+    # A dependency file left by an earlier run must never be taken for the one of this run
+    if (os.path.isfile(deps_file)):
+        os.remove(deps_file)
+
+    start = time.perf_counter()
+    result = run_process('iwyu', command, label=source_file, cwd=entry['directory'], capture_output=True, text=True, errors='replace')
+    duration = time.perf_counter() - start
+
+    # IWYU exits with a non-zero code whenever it has suggestions, only a missing verdict means it failed
+    output = result.stderr + result.stdout
+    if ('should add these lines:' not in output) and ('has correct #includes/fwd-decls' not in output):
+        return [source_file, None, None, duration, output]
+
+    # Without a dependency file the headers of the unit are unknown, its result is then used but not cached
+    if (os.path.isfile(deps_file) == False):
+        return [source_file, output, None, duration, None]
+
+    dependencies = {source_file: hash_file(source_file)}
+    for dependency in read_deps_file(deps_file):
+        dependency_path = Path(os.path.join(entry['directory'], dependency)).absolute().as_posix()
+        if (os.path.isfile(dependency_path)):
+            dependencies[dependency_path] = hash_file(dependency_path)
+
+    return [source_file, output, dependencies, duration, None]
+
+
+
+@traced('execute_iwyu')
+def execute_iwyu(args, source_files, state=None):
     print(f'Executing IWYU ...')
-    
-    #iwyu_scan_command = f'python3.11 C:/msys64/ucrt64/bin/iwyu_tool.py -v -p {args.bin_dir}/compile_commands.json 2> {args.bin_dir}/iwyu.log'
-    #        
-    #with open(f'{args.bin_dir}/iwyu_scan_out.txt', 'w') as iwyu_scan_result_file:
-    #    iwyu_scan_result_file.write(f'COMMAND: {iwyu_scan_command}\n')
-    #    iwyu_scan_result_file.flush()
-    #    
-    #    iwyu_scan_result = subprocess.run(iwyu_scan_command, stdout=iwyu_scan_result_file, shell=True)
-    #
-    #    if (iwyu_scan_result.returncode != 0):
-    #        print(f'...... IWYU scan ERROR, error log available at {iwyu_scan_result_file.name} ...')
-    #        exit(-1)
-    #    
-        
-    iwyu_cleanup_command = f'python3.11 C:/msys64/ucrt64/bin/fix_includes.py --nosafe_headers --ignore_re "{args.bin_dir}(/extern/|\\extern\\).*" {args.bin_dir}/iwyu.log'
+
+    iwyu_path = find_tool(args.iwyu, ['include-what-you-use', 'iwyu'])
+    fix_includes_path = find_fix_includes(args, iwyu_path)
+    if (iwyu_path is None) or (fix_includes_path is None):
+        print(f'...... IWYU ERROR, include-what-you-use or fix_includes.py is not available, use --iwyu and --fix_includes to locate them ...')
+        raise SystemExit(-1)
+
+    compile_commands_file = f'{args.bin_dir}/compile_commands.json'
+    if (os.path.isfile(compile_commands_file) == False):
+        print(f'...... IWYU ERROR, {compile_commands_file} is missing, configure with CMAKE_EXPORT_COMPILE_COMMANDS=ON ...')
+        raise SystemExit(-1)
+
+    with open(compile_commands_file, 'r') as file:
+        compile_commands = json.load(file)
+
+    # Only the requested sources are analysed, their headers are reported through the translation units
+    source_files = set(source_files)
+    entries = [entry for entry in compile_commands if (Path(os.path.join(entry['directory'], entry['file'])).absolute().as_posix() in source_files)]
+
+    cache_file = f'{args.bin_dir}/iwyu_cache.json'
+    deps_dir = Path(f'{args.bin_dir}/iwyu_deps').absolute().as_posix()
+    Path(deps_dir).mkdir(parents=True, exist_ok=True)
+    cache = load_json_file(cache_file, {'units': dict()})
+
+    # A unit is analysed again when its command, its source or any header it included changed
+    state = state if (state is not None) else dict()
+    file_hashes = dict()
+    pending = []
+    for entry in entries:
+        source_file = Path(os.path.join(entry['directory'], entry['file'])).absolute().as_posix()
+        command_hash = hashlib.sha1(json.dumps([entry['directory'], iwyu_command(entry, iwyu_path, args.mapping_file, '')]).encode()).hexdigest()
+        if (iwyu_entry_valid(cache['units'].get(source_file), command_hash, file_hashes, state.setdefault('hash_cache', dict())) == False):
+            pending.append([entry, command_hash])
+
+    with ThreadPoolExecutor(max_workers=args.iwyu_jobs) as executor:
+        results = list(executor.map(lambda item: analyse_translation_unit(item[0], iwyu_path, args.mapping_file, deps_dir), pending))
+
+    failed = False
+    outputs = dict()
+    with open(f'{args.bin_dir}/iwyu_scan_out.txt', 'w') as iwyu_scan_result_file:
+        for [[entry, command_hash], [source_file, output, dependencies, duration, error]] in zip(pending, results):
+            if (error is not None):
+                failed = True
+                cache['units'].pop(source_file, None)
+                iwyu_scan_result_file.write(f'{duration * 1000:10.1f} ms  {source_file} - ERROR\n{error}\n')
+            elif (dependencies is None):
+                cache['units'].pop(source_file, None)
+                outputs[source_file] = output
+                iwyu_scan_result_file.write(f'{duration * 1000:10.1f} ms  {source_file} - not cached, no dependency file\n')
+            else:
+                cache['units'][source_file] = {'command': command_hash, 'dependencies': dependencies, 'output': output}
+                iwyu_scan_result_file.write(f'{duration * 1000:10.1f} ms  {source_file}\n')
+
+    save_json_file(cache_file, cache)
+    if (failed):
+        print(f'...... IWYU scan ERROR, error log available at {iwyu_scan_result_file.name} ...')
+        raise SystemExit(-1)
+
+    trace_counters(files=len(pending))
+    print(f'...... {len(pending)} of {len(entries)} translation units analysed, {len(entries) - len(pending)} unchanged since the last run')
+
+    # Cached and fresh results together form the log fix_includes.py expects on its input
+    with open(f'{args.bin_dir}/iwyu.log', 'w') as iwyu_log_file:
+        for entry in entries:
+            source_file = Path(os.path.join(entry['directory'], entry['file'])).absolute().as_posix()
+            iwyu_log_file.write(outputs[source_file] if (source_file in outputs) else cache['units'][source_file]['output'])
+
+    iwyu_cleanup_command = [sys.executable, fix_includes_path, '--nosafe_headers', '--ignore_re', re.escape(args.bin_dir) + r'[/\\]extern[/\\].*']
     
     with open(f'{args.bin_dir}/iwyu_cleanup_out.txt', 'w') as iwyu_cleanup_result_file:
-        iwyu_cleanup_result_file.write(f'COMMAND: {iwyu_cleanup_command}\n')
-        iwyu_cleanup_result_file.flush()
-        
-        iwyu_cleanup_result = subprocess.run(iwyu_cleanup_command, stdout=iwyu_cleanup_result_file, shell=True)
-        
-        if (iwyu_cleanup_result.returncode != 0):
+        with open(f'{args.bin_dir}/iwyu.log', 'r') as iwyu_log_file:
+            iwyu_cleanup_result_file.write(f'COMMAND: {" ".join(iwyu_cleanup_command)} < {iwyu_log_file.name}\n')
+            iwyu_cleanup_result_file.flush()
+
+            iwyu_cleanup_result = run_process('fix_includes', iwyu_cleanup_command, stdin=iwyu_log_file, stdout=iwyu_cleanup_result_file, stderr=subprocess.STDOUT)
+
+    # fix_includes.py exits with the number of edited files, so a crash is only recognised by its traceback
+    with open(f'{args.bin_dir}/iwyu_cleanup_out.txt', 'r') as iwyu_cleanup_result_file:
+        if (iwyu_cleanup_result.returncode < 0) or ('Traceback (most recent call last)' in iwyu_cleanup_result_file.read()):
             print(f'...... IWYU clean-up ERROR, error log available at {iwyu_cleanup_result_file.name} ...')
-            exit(-1)
+            raise SystemExit(-1)
 
     print(f'... DONE')
     pass
 
 
 
-def execute_clang_format(args):
+def split_batches(files, batch_count):
+    # Formatting time grows with the file size, so the largest files are spread first
+    batch_heap = [[0, batch_index] for batch_index in range(batch_count)]
+    batches = [[] for batch_index in range(batch_count)]
+    for file in sorted(files, key=lambda file: os.path.getsize(file), reverse=True):
+        [load, batch_index] = heapq.heappop(batch_heap)
+        batches[batch_index].append(file)
+        heapq.heappush(batch_heap, [load + os.path.getsize(file), batch_index])
+
+    return [batch for batch in batches if (len(batch) > 0)]
+
+
+
+@traced('format_batch')
+def format_batch(style_argument, batch, check):
+    # With --verbose clang-format announces every file before it processes it, which gives the cost of each file
+    command = ['clang-format', style_argument, '--verbose'] + (['--dry-run', '-Werror'] if (check) else ['-i']) + batch
+
+    costs = dict()
+    dirty = set()
+    errors = []
+    current_file = None
+    current_start = time.perf_counter()
+
+    process = AccountedProcess('clang_format', command, label=f'{len(batch)} files', stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors='replace')
+    for line in process.stderr:
+        if (line.startswith('Formatting [')):
+            now = time.perf_counter()
+            if (current_file is not None):
+                costs[current_file] = now - current_start
+            current_file = line.split('] ', 1)[1].strip()
+            current_start = now
+        else:
+            errors.append(line)
+            if (current_file is not None) and ('clang-format-violations' in line):
+                dirty.add(current_file)
+    returncode = process.wait()
+
+    if (current_file is not None):
+        costs[current_file] = time.perf_counter() - current_start
+
+    return [returncode, costs, dirty, errors]
+
+
+
+@traced('execute_clang_format')
+def execute_clang_format(args, source_files, state=None):
     print(f'Executing Clang-Format ...')
     
-    source_argument = args.source_files.replace(',', ' ')
-    
-    command = f'clang-format -style=file:{Path(args.style_file).absolute().as_posix()} -i {source_argument}'
-    
+    style_argument = f'-style=file:{Path(args.style_file).absolute().as_posix()}' if (args.style_file is not None) else '-style=file'
+
+    # Cached hashes are only valid for the same formatter and style
+    state = state if (state is not None) else dict()
+    if ('clang_format_version' not in state):
+        state['clang_format_version'] = run_process('tool_probe', ['clang-format', '--version'], label='clang-format', capture_output=True, text=True).stdout
+    version = state['clang_format_version']
+    style_hash = hash_file(args.style_file) if (args.style_file is not None) else ''
+    cache_key = hashlib.sha1(f'{version}|{style_argument}|{style_hash}'.encode()).hexdigest()
+
+    cache_file = f'{args.bin_dir}/clang_format_cache.json'
+    cache = load_json_file(cache_file, {'key': cache_key, 'files': dict()})
+    if (cache.get('key') != cache_key):
+        cache = {'key': cache_key, 'files': dict()}
+
+    source_hashes = {source_file: hash_file(source_file, state.setdefault('hash_cache', dict())) for source_file in source_files}
+    pending = [source_file for source_file in source_files if (cache['files'].get(source_file) != source_hashes[source_file])]
+
+    batches = split_batches(pending, min(args.format_jobs, len(pending)))
+    with ThreadPoolExecutor(max_workers=max(len(batches), 1)) as executor:
+        results = list(executor.map(lambda batch: format_batch(style_argument, batch, args.check), batches))
+
+    costs = dict()
+    dirty = set()
+    failed = False
     with open(f'{args.bin_dir}/clang_format_out.txt', 'w') as clang_format_output_file:
         with open(f'{args.bin_dir}/clang_format_err.txt', 'w') as clang_format_error_file:
-            clang_format_result = subprocess.run(command, stdout=clang_format_output_file, stderr=clang_format_error_file)
-        
-            if (clang_format_result.returncode == 0):
-                print(f'...... Clang-Format clean-up OK, log: {clang_format_output_file.name}')
-            else:
-                print(f'...... Clang-Format clean-up ERROR, error log available at {clang_format_error_file.name} ...')
-                exit(-1)
+            for [batch, [returncode, batch_costs, batch_dirty, batch_errors]] in zip(batches, results):
+                costs.update(batch_costs)
+                dirty.update(batch_dirty)
+                clang_format_error_file.writelines(batch_errors)
+
+                # A failing batch in check mode only means dirty files, anything else is an error
+                if (returncode != 0) and ((args.check == False) or (len(batch_dirty) == 0)):
+                    failed = True
+                    continue
+
+                for source_file in batch:
+                    if (source_file not in batch_dirty):
+                        cache['files'][source_file] = hash_file(source_file, state['hash_cache']) if (args.check == False) else source_hashes[source_file]
+
+            clang_format_output_file.write(f'COMMAND: clang-format {style_argument} {"--dry-run -Werror" if (args.check) else "-i"} ({len(batches)} batches)\n')
+            for [source_file, cost] in sorted(costs.items(), key=lambda item: item[1], reverse=True):
+                clang_format_output_file.write(f'{cost * 1000:10.1f} ms  {source_file}\n')
+
+    save_json_file(cache_file, cache)
+
+    if (failed):
+        print(f'...... Clang-Format clean-up ERROR, error log available at {clang_format_error_file.name} ...')
+        raise SystemExit(-1)
+
+    trace_counters(files=len(pending))
+    print(f'...... {len(pending)} of {len(source_files)} files processed in {len(batches)} batches, {len(source_files) - len(pending)} unchanged since the last run')
+    for source_file in sorted(dirty):
+        print(f'...... Not formatted: {source_file}')
 
+    if (len(dirty) > 0):
+        print(f'...... Clang-Format check ERROR, {len(dirty)} files need formatting, costs available at {clang_format_output_file.name} ...')
+        raise SystemExit(-1)
+
+    print(f'...... Clang-Format {"check" if (args.check) else "clean-up"} OK, log: {clang_format_output_file.name}')
     print(f'... DONE')
     pass
 
@@ -83,29 +387,73 @@ def execute_clang_format(args):
 
 
 
-# Define argument parser
-parser = argparse.ArgumentParser(
-                    prog='File search and copy helper script.',
-                    description='Copies either a single file, or multiple files by search (either by extensions or glob query).')
+def main(argv=None, state=None):
+    # Every stage can be run in-process, the state carries indexes and caches from one stage to the next
+    state = state if (state is not None) else dict()
+
+    # Define argument parser
+    parser = argparse.ArgumentParser(
+                        prog='File search and copy helper script.',
+                        description='Copies either a single file, or multiple files by search (either by extensions or glob query).')
+
+    parser.add_argument('-b',             '--bin_dir',       action='store',      required=True,   help='Output of all generated files for the build (equivalent to CMAKE_CURRENT_BINARY_DIR)')                                          
+    parser.add_argument('-i',             '--include_dirs',  action='store',      required=False,  help='Include directories against which to perform search for includes during analysis')
+    parser.add_argument('-s',             '--source_files',  action='store',      required=True,   help='C++ header and source files to analyze')
+    parser.add_argument('--std',          '--std',           action='store',      required=False,  help='C++ standard used in the code')
+    parser.add_argument('--mapping_file', '--mapping_file',  action='store',      required=False,  help='Path to the IWYU mapping file')
+    parser.add_argument('--style_file',   '--style_file',    action='store',      required=False,  help='Path to the Clang Format style file')
+    parser.add_argument('--iwyu',         '--iwyu',          action='store',      required=False,  help='Path to the include-what-you-use executable, searched on PATH by default')
+    parser.add_argument('--fix_includes', '--fix_includes',  action='store',      required=False,  help='Path to the fix_includes.py script, searched on PATH and next to include-what-you-use by default')
+    parser.add_argument('--iwyu_jobs',    '--iwyu_jobs',     action='store',      required=False,  type=int, default=os.cpu_count() or 1, help='Number of translation units analysed concurrently')
+    parser.add_argument('--format_jobs',  '--format_jobs',   action='store',      required=False,  type=int, default=os.cpu_count() or 1, help='Number of Clang Format processes running concurrently, each formats its own batch of files')
+    parser.add_argument('--check',        '--check',         action='store_true', required=False,  help='Only report the files that are not formatted, without rewriting them')
+    parser.add_argument('--changed',      '--changed',       action='store',      required=False,  help='Comma-separated changed files, or "auto" for the changes since the previous run, limits the tasks to the affected files')
+    parser.add_argument('--trace',        '--trace',         action='store',      required=False,  default=os.environ.get(TRACE_ENVIRONMENT), help='Write a Chrome trace of the timed steps to this file and print a summary table at the end')
+    parser.add_argument('--run_report',   '--run_report',    action='store',      required=False,  default=os.environ.get(REPORT_ENVIRONMENT), help='Append the wall time, CPU time, peak memory and I/O of every child process to this JSON report and print a summary per step')
+    parser.add_argument('--time_limit',   '--time_limit',    action='store',      required=False,  help='Time limit in seconds of every child process, or comma-separated step=seconds pairs (iwyu, fix_includes, clang_format, tool_probe), exceeding children are stopped')
+    parser.add_argument('--memory_limit', '--memory_limit',  action='store',      required=False,  help='Address space limit in MB of every child process, or comma-separated step=MB pairs (Linux only)')
+    parser.add_argument('--tasks',        '--tasks',         action='store',      required=False,  default='iwyu,clang_format', help='Comma separated list of tasks to execute (iwyu, clang_format)')
+
+    args = parser.parse_args(argv)
+    enable_tracing(args.trace)
+    enable_run_report(args.run_report, 'pre_build', args.time_limit, args.memory_limit)
+
+
+
+    tasks = args.tasks.split(',')
+    bin_dir = Path(os.path.abspath(args.bin_dir)).as_posix()
+    source_files = [normalize_path(source_file) for source_file in args.source_files.split(',') if (source_file != '')]
+    iwyu_files = source_files
+    format_files = source_files
+
+
+    # Limit the tasks to what the changes can reach, changes that cannot be traced (build scripts, removed files) keep the full set
+    if (args.changed is not None):
+        impact = affected_by_changes(bin_dir, args.changed, 'pre_build', state=state)
+        if (impact is not None) and (len(impact['unknown']) == 0):
+            iwyu_files = [source_file for source_file in source_files if (source_file in impact['units'])]
+            format_files = [source_file for source_file in source_files if (source_file in impact['changed'])]
+            print(f'Changes affect {len(iwyu_files)} translation units and {len(format_files)} files to format')
+
+
+    # Execute Include What You Use
+    if ('iwyu' in tasks):
+        execute_iwyu(args, iwyu_files, state)
 
-parser.add_argument('-b',             '--bin_dir',       action='store',      required=True,   help='Output of all generated files for the build (equivalent to CMAKE_CURRENT_BINARY_DIR)')                                          
-parser.add_argument('-i',             '--include_dirs',  action='store',      required=True,   help='Include directories against which to perform search for includes during analysis')
-parser.add_argument('-s',             '--source_files',  action='store',      required=True,   help='C++ header and source files to analyze')
-parser.add_argument('--std',          '--std',           action='store',      required=True,   help='C++ standard used in the code')
-parser.add_argument('--mapping_file', '--mapping_file',  action='store',      required=False,  help='Path to the IWYU mapping file')
-parser.add_argument('--style_file',   '--style_file',    action='store',      required=False,  help='Path to the Clang Format style file')
 
-args = parser.parse_args()
+    # Execute Clang Format
+    if ('clang_format' in tasks):
+        execute_clang_format(args, format_files, state)
 
 
+    if (args.changed is not None):
+        acknowledge_changes(bin_dir, 'pre_build', state)
 
-# Execute Include What You Use
-execute_iwyu(args)
 
+    print(f'COMPLETE: Finished processing files')
+    return 0
 
-# Execute Clang Format
-execute_clang_format(args)
 
 
-print(f'COMPLETE: Finished processing files')
-exit(0)
\ No newline at end of file
+if (__name__ == '__main__'):
+    sys.exit(main())
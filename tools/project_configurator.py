@@ -13,13 +13,34 @@ import sys
 import stat
 import json
 import glob
+import fnmatch
+import shlex
 import shutil
+import time
 import hashlib
-import urllib.request
+import contextlib
 import argparse
+import threading
 import subprocess
 from re import L
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .tracing import TRACE_ENVIRONMENT, traced, trace_counters, enable_tracing
+    from .json_files import load_json_file, save_json_file
+    from .run_report import REPORT_ENVIRONMENT, AccountedProcess, run_process, enable_run_report
+except ImportError:
+    from tracing import TRACE_ENVIRONMENT, traced, trace_counters, enable_tracing
+    from json_files import load_json_file, save_json_file
+    from run_report import REPORT_ENVIRONMENT, AccountedProcess, run_process, enable_run_report
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    import msvcrt
 
 
 
@@ -29,6 +50,11 @@ from pathlib import Path
 
 
 
+# Size of the blocks read from the network and the local archives
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+
+
+
 def ExitWithError(message):
     print(message)
     sys.exit(message)
@@ -41,19 +67,73 @@ def RemoveReadOnly(func, path, _):
     
 
 
-def CheckTool(executable, version_string=None):
-    output = subprocess.run(f'{executable} --version', capture_output=True, shell=True)
+def ProbeTool(command_args, timeout, tool_cache=None):
+    # Results are reused for as long as the resolved executable is not replaced
+    executable_path = shutil.which(command_args[0])
+    if (executable_path is None):
+        return [None, None]
+
+    executable_stat = os.stat(executable_path)
+    cache_key = f'{Path(executable_path).as_posix()}|{executable_stat.st_mtime_ns}|{executable_stat.st_size}|{" ".join(command_args[1:])}'
+    if (tool_cache is not None) and (cache_key in tool_cache['probes']):
+        return tool_cache['probes'][cache_key]
+
+    try:
+        output = run_process('tool_probe', [executable_path] + command_args[1:] + ['--version'], label=command_args[0], capture_output=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return [None, None]
+
+    result = [output.returncode, output.stdout.decode('ascii', errors='replace')]
+    if (tool_cache is not None) and (output.returncode == 0):
+        with tool_cache['lock']:
+            tool_cache['probes'][cache_key] = result
+            tool_cache['changed'] = True
+    return result
+
+
+
+@traced('CheckTool', 'executable')
+def CheckTool(executable, version_string=None, timeout=None, tool_cache=None):
+    [returncode, version] = ProbeTool(shlex.split(executable, posix=(os.name != 'nt')), timeout, tool_cache)
     
-    if (output.returncode != 0):
-        ExitWithError(f'\tERROR: {executable} is not available, leaving...')
+    if (returncode != 0):
+        return [None, f'\tERROR: {executable} is not available, leaving...']
     else:
-        version = output.stdout.decode('ascii')
-        
         if (version_string is not None):            
             if (version_string not in version):
-                ExitWithError(f'\tERROR: executable "{executable}" does not match the version requirements, please install {version_string}, leaving...')
+                return [None, f'\tERROR: executable "{executable}" does not match the version requirements, please install {version_string}, leaving...']
+
+        return [f'\tFound: {version.replace('\r\n','').replace('\n','')}', None]
+
+
 
-        print(f'\tFound: {version.replace('\r\n','').replace('\n','')}')
+def CheckTools(tools, jobs, timeout, cache_dir=None, state=None):
+    # Within one interpreter the probes loaded by a previous stage are reused as they are
+    tool_cache = state.get('tool_cache') if (state is not None) and (cache_dir is not None) else None
+    if (cache_dir is not None) and (tool_cache is None):
+        tool_cache = {'probes': dict(), 'changed': False, 'lock': threading.Lock()}
+        tool_cache['probes'] = load_json_file(f'{cache_dir}/tools.json', dict())
+        if (state is not None):
+            state['tool_cache'] = tool_cache
+
+    # Probe all tools at once and report in the requested order
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(lambda tool: CheckTool(tool[0], tool[1], timeout, tool_cache), tools))
+
+    errors = []
+    for [found, error] in results:
+        if (found is not None):
+            print(found)
+        else:
+            errors.append(error)
+
+    if (tool_cache is not None) and (tool_cache['changed']):
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        with FileLock(f'{cache_dir}/locks/tools.lock'):
+            save_json_file(f'{cache_dir}/tools.json', tool_cache['probes'])
+        tool_cache['changed'] = False
+
+    return errors
 
 
 
@@ -70,178 +150,758 @@ def ResetDirectory(folder):
 
 
 
-def FetchGitRepo(git_dir, name, repo, hash):
+class FetchError(Exception):
+    pass
+
+
+
+def RunCommand(command_args, log_file, cancel_event=None):
+    # Run the command with its output going to the log file, stopping it as soon as the fetching gets cancelled
+    log_file.write(f'COMMAND: {" ".join(command_args)}\n')
+    log_file.flush()
+
+    process = AccountedProcess(os.path.basename(command_args[0]), command_args, stdout=log_file, stderr=subprocess.STDOUT)
+    while True:
+        try:
+            return process.wait(timeout=0.1)
+        except subprocess.TimeoutExpired:
+            if (cancel_event is not None) and (cancel_event.is_set()):
+                process.terminate()
+                process.wait()
+                raise FetchError(f'cancelled')
+
+
+
+def UpdateGitMirror(mirror_dir, repo, hash, offline, log_file, cancel_event=None):
+    # Bare repository mirroring every reference of the remote, created empty so that a pinned commit can be fetched alone
+    if (os.path.exists(mirror_dir) == False):
+        if (offline):
+            raise FetchError(f'repository {repo} is not in the cache')
+        if (RunCommand(['git', 'init', '--bare', '--quiet', mirror_dir], log_file, cancel_event) != 0) or\
+           (RunCommand(['git', '-C', mirror_dir, 'remote', 'add', '--mirror=fetch', 'origin', repo], log_file, cancel_event) != 0):
+            raise FetchError(f'could not create the mirror of {repo}')
+
+    if (hash is not None):
+        # Only talk to the remote when the pinned commit is missing, trying a shallow fetch of just that commit first
+        if (RunCommand(['git', '-C', mirror_dir, 'cat-file', '-e', f'{hash}^{{commit}}'], log_file, cancel_event) != 0):
+            if (offline):
+                raise FetchError(f'commit {hash} of {repo} is not in the cache')
+            if (RunCommand(['git', '-C', mirror_dir, 'fetch', '--depth', '1', 'origin', hash], log_file, cancel_event) != 0):
+                if (RunCommand(['git', '-C', mirror_dir, 'fetch', 'origin'], log_file, cancel_event) != 0):
+                    raise FetchError(f'could not fetch commit {hash} of {repo}')
+
+        # Keep the commit referenced so that it survives garbage collection of the mirror
+        if (RunCommand(['git', '-C', mirror_dir, 'update-ref', f'refs/pinned/{hash}', hash], log_file, cancel_event) != 0):
+            raise FetchError(f'commit {hash} does not exist in {repo}')
+        return hash
+
+    # Without a pin the remote default branch is followed
+    if (offline == False):
+        if (RunCommand(['git', '-C', mirror_dir, 'fetch', 'origin'], log_file, cancel_event) != 0):
+            raise FetchError(f'could not fetch {repo}')
+
+        remote_head = run_process('git', ['git', '-C', mirror_dir, 'ls-remote', '--symref', 'origin', 'HEAD'], capture_output=True, text=True)
+        for line in remote_head.stdout.splitlines():
+            if (line.startswith('ref: ')):
+                RunCommand(['git', '-C', mirror_dir, 'symbolic-ref', 'HEAD', line[len('ref: '):].split()[0]], log_file, cancel_event)
+
+    return 'HEAD'
+
+
+
+@traced('FetchGitRepo', 'name')
+def FetchGitRepo(git_dir, name, repo, hash, cache=None, log=print, cancel_event=None):
     git_dir = Path(os.path.abspath(git_dir + f'./{name}')).as_posix()
     
     if (os.path.exists(git_dir)):
-        ExitWithError(f'\tERROR: Failed to clone repo "{name}", target directory "{git_dir}" alredy exists, leaving...')
-    
-    if (hash is None):
-        output = subprocess.run(f'git clone {repo} {git_dir}', capture_output=True, shell=True)
-    else:
-        output = subprocess.run(f'git clone {repo} {git_dir} && cd {git_dir} && git checkout {hash}', capture_output=True, shell=True)
+        raise FetchError(f'\tERROR: Failed to clone repo "{name}", target directory "{git_dir}" alredy exists, leaving...')
+
+    try:
+        # The log sits next to the clone, whose parent git clone would only create later
+        Path(os.path.dirname(git_dir)).mkdir(parents=True, exist_ok=True)
+        with open(f'{git_dir}.log', 'w') as log_file:
+            if (cache is None):
+                returncode = RunCommand(['git', 'clone', repo, git_dir], log_file, cancel_event)
+
+                if (returncode == 0) and (hash is not None):
+                    returncode = RunCommand(['git', '-C', git_dir, 'checkout', hash], log_file, cancel_event)
+            else:
+                # Check out a worktree of the local mirror, the mirror stays locked while being updated
+                mirror_dir = f'{cache["dir"]}/git/{hashlib.sha256(repo.encode("utf-8")).hexdigest()[:16]}.git'
+                with FileLock(f'{cache["dir"]}/locks/git-{os.path.basename(mirror_dir)}.lock'):
+                    try:
+                        revision = UpdateGitMirror(mirror_dir, repo, hash, cache['offline'], log_file, cancel_event)
+                    except FetchError as e:
+                        if (f'{e}' == 'cancelled'):
+                            raise
+                        raise FetchError(f'\tERROR: Failed to clone repo "{name}", {e}, error log available at {log_file.name}, leaving...')
+
+                    # Worktrees removed along with the previous checkout must be forgotten before adding the new one
+                    RunCommand(['git', '-C', mirror_dir, 'worktree', 'prune'], log_file, cancel_event)
+                    returncode = RunCommand(['git', '-C', mirror_dir, 'worktree', 'add', '--detach', git_dir, revision], log_file, cancel_event)
+
+        if (returncode != 0):
+            raise FetchError(f'\tERROR: Failed to clone repo "{name}", error log available at {log_file.name}, leaving...')
+    except Exception:
+        # Do not leave a partial clone behind, it would block the next run
+        if (os.path.exists(git_dir)):
+            shutil.rmtree(git_dir, onexc=RemoveReadOnly)
+        raise
+
+    log(f'\tRepo "{name}" cloned to {git_dir}')
+
+
+
+@contextlib.contextmanager
+def FileLock(lock_path, blocking=True):
+    # Exclusive lock shared between threads and processes on the same host, a non-blocking attempt raises OSError when taken
+    Path(os.path.dirname(lock_path)).mkdir(parents=True, exist_ok=True)
+
+    with open(lock_path, 'a+b') as lock_file:
+        if (msvcrt is not None):
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if (blocking == False):
+                        raise
+                    time.sleep(0.1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if (blocking) else (fcntl.LOCK_EX | fcntl.LOCK_NB))
+
+        try:
+            yield
+        finally:
+            if (msvcrt is not None):
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+
+def CacheKey(url, md5=None, sha256=None):
+    # Only verifiable content can be shared, resources without checksums are always downloaded
+    if (sha256 is not None):
+        return f'sha256-{sha256.lower()}'
+    if (md5 is not None):
+        return f'md5-{hashlib.sha256(f"{url}|{md5.lower()}".encode("utf-8")).hexdigest()}'
+    return None
+
+
+
+def EvictCache(cache):
+    objects_dir = f'{cache["dir"]}/objects'
+    if (os.path.isdir(objects_dir) == False):
+        return
+
+    with FileLock(f'{cache["dir"]}/locks/evict.lock'):
+        # Last access is recorded as the modification time of the entry directory
+        entries = []
+        for entry in os.scandir(objects_dir):
+            if entry.is_dir():
+                entry_size = sum([os.path.getsize(f'{entry.path}/{file}') for file in os.listdir(entry.path)])
+                entries.append([entry.stat().st_mtime, entry.name, entry_size])
+
+        cache_size = sum([entry_size for [entry_time, key, entry_size] in entries])
+        for [entry_time, key, entry_size] in sorted(entries):
+            if (cache_size <= cache['size_limit']):
+                break
+
+            # Entries in use by another fetch are left alone
+            try:
+                with FileLock(f'{cache["dir"]}/locks/{key}.lock', blocking=False):
+                    shutil.rmtree(f'{objects_dir}/{key}', onexc=RemoveReadOnly)
+                    cache_size -= entry_size
+            except OSError:
+                continue
+
+
+
+class DigestReader:
+    # File-like view of the download that hashes the bytes as they arrive, so the archive never has to be read again
+    def __init__(self, stream, md5=None, sha256=None, cancel_event=None):
+        self.stream = stream
+        self.md5_hash = hashlib.md5() if (md5 is not None) else None
+        self.sha256_hash = hashlib.sha256() if (sha256 is not None) else None
+        self.cancel_event = cancel_event
+
+    def read(self, size=-1):
+        if (self.cancel_event is not None) and (self.cancel_event.is_set()):
+            raise FetchError(f'cancelled')
+
+        byte_block = self.stream.read(size)
+        trace_counters(bytes=len(byte_block))
+        if (self.md5_hash is not None):
+            self.md5_hash.update(byte_block)
+        if (self.sha256_hash is not None):
+            self.sha256_hash.update(byte_block)
+        return byte_block
+
+    def drain(self):
+        while (len(self.read(DOWNLOAD_BUFFER_SIZE)) > 0):
+            pass
+
+    def verify(self, name, md5=None, sha256=None):
+        if (md5 is not None) and (self.md5_hash.hexdigest() != md5):
+            raise FetchError(f'\tERROR: Failed to download resource "{name}", MD5 mismatch, leaving...')
+
+        if (sha256 is not None) and (self.sha256_hash.hexdigest() != sha256):
+            raise FetchError(f'\tERROR: Failed to download resource "{name}", SHA256 mismatch, leaving...')
+
+
+
+def DownloadResource(name, url, file_path, md5=None, sha256=None, cancel_event=None):
+    # Networking and archive modules are only imported once something is downloaded, a no-op configure never pays for them
+    import urllib.request
+
+    with urllib.request.urlopen(url) as response:
+        reader = DigestReader(response, md5, sha256, cancel_event)
+        with open(file_path, 'wb') as file:
+            for byte_block in iter(lambda: reader.read(DOWNLOAD_BUFFER_SIZE), b""):
+                file.write(byte_block)
+
+    reader.verify(name, md5, sha256)
 
-    if (output.returncode == 0):
-        print(f'\tRepo "{name}" cloned to {git_dir}')
-    else:
-        ExitWithError(f'\tERROR: Failed to clone repo "{name}" with error {output.stderr}, leaving...')
 
 
+def ExtractResource(name, file_path, wget_dir):
+    import tarfile
+    import zipfile
 
-def FetchWgetResource(wget_dir, name, url, md5=None, sha256=None):
+    try:
+        if (zipfile.is_zipfile(file_path)):
+            with zipfile.ZipFile(file_path) as archive:
+                archive.extractall(wget_dir)
+        else:
+            with tarfile.open(file_path, 'r:*') as archive:
+                archive.extractall(wget_dir, filter='tar')
+    except (tarfile.TarError, zipfile.BadZipFile, OSError) as e:
+        raise FetchError(f'\tERROR: Could not unpack the "{name}" ({file_path}) with error {e}, leaving...')
+
+
+
+def StreamResource(name, url, wget_dir, md5=None, sha256=None, cancel_event=None):
+    import tarfile
+    import urllib.request
+
+    # Zip archives need random access, they still go through a temporary file
+    if (os.path.basename(url).lower().endswith('.zip')):
+        file_path = f'{wget_dir}/{os.path.basename(url)}'
+        DownloadResource(name, url, file_path, md5, sha256, cancel_event)
+        ExtractResource(name, file_path, wget_dir)
+        os.remove(file_path)
+        return
+
+    # Tarballs are unpacked while downloading, a checksum mismatch discards the extracted files afterwards
+    with urllib.request.urlopen(url) as response:
+        reader = DigestReader(response, md5, sha256, cancel_event)
+        try:
+            with tarfile.open(fileobj=reader, mode='r|*', bufsize=DOWNLOAD_BUFFER_SIZE) as archive:
+                archive.extractall(wget_dir, filter='tar')
+        except tarfile.TarError as e:
+            raise FetchError(f'\tERROR: Could not unpack the "{name}" ({url}) with error {e}, leaving...')
+        reader.drain()
+
+    reader.verify(name, md5, sha256)
+
+
+
+@traced('FetchWgetResource', 'name')
+def FetchWgetResource(wget_dir, name, url, md5=None, sha256=None, cache=None, log=print, cancel_event=None):
     wget_dir = Path(os.path.abspath(wget_dir + f'./{name}')).as_posix()
     filename = os.path.basename(url)
     file_path = f'{wget_dir}/{filename}'
 
     if (os.path.exists(wget_dir)):
-        ExitWithError(f'\tERROR: Failed to download resource "{name}", target directory "{wget_dir}" alredy exists, leaving...')
+        raise FetchError(f'\tERROR: Failed to download resource "{name}", target directory "{wget_dir}" alredy exists, leaving...')
+
+    key = CacheKey(url, md5, sha256) if (cache is not None) else None
+    if (cache is not None) and (cache['offline']) and (key is None):
+        raise FetchError(f'\tERROR: Failed to fetch resource "{name}" offline, it has no checksum to look it up in the cache with, leaving...')
 
     try:
+        Path(os.path.dirname(wget_dir)).mkdir(parents=True, exist_ok=True)
         os.mkdir(f'{wget_dir}')
-        urllib.request.urlretrieve(url, f'{file_path}')
-    except Exception as e:
-        ExitWithError(f'\tERROR: Failed to download resource "{name}" with error {e}, leaving...')
 
-    try:
-        if (md5 is not None):
-            md5_hash = hashlib.md5()
-            with open(file_path, 'rb') as file:
-                for byte_block in iter(lambda: file.read(4096), b""):
-                    md5_hash.update(byte_block)
-        
-            md5_hash = md5_hash.hexdigest()
-            
-            if (md5_hash != md5):
-                ExitWithError(f'\tERROR: Failed to download resource "{name}", MD5 mismatch, leaving...')
-
-        if (sha256 is not None):
-            sha256_hash = hashlib.sha256()
-            with open(file_path, 'rb') as file:
-                for byte_block in iter(lambda: file.read(4096), b""):
-                    sha256_hash.update(byte_block)
-        
-            sha256_hash = sha256_hash.hexdigest()
-            
-            if (sha256_hash != sha256):
-                ExitWithError(f'\tERROR: Failed to download resource "{name}", SHA256 mismatch, leaving...')
-        
-        output = subprocess.run(f'tar -xvf {file_path} -C {wget_dir}', capture_output=True, shell=True)
-        if (output.returncode != 0):
-            ExitWithError(f'\tERROR: Could not unpack the "{name}" ({file_path}) with error {e}, leaving...')
-        
-        os.remove(file_path)
-        
-        print(f'\tResource "{name}" downloaded to {wget_dir}')
+        if (key is None):
+            StreamResource(name, url, wget_dir, md5, sha256, cancel_event)
+            log(f'\tResource "{name}" downloaded to {wget_dir}')
+        else:
+            entry_dir = f'{cache["dir"]}/objects/{key}'
+            cached_file = f'{entry_dir}/{filename}'
+
+            # The entry stays locked while in use so that neither another fetch nor the eviction can touch it
+            with FileLock(f'{cache["dir"]}/locks/{key}.lock'):
+                if (os.path.isfile(cached_file)):
+                    os.utime(entry_dir)
+                    trace_counters(cache_hits=1)
+                    ExtractResource(name, cached_file, wget_dir)
+                    log(f'\tResource "{name}" extracted from cache to {wget_dir}')
+                else:
+                    if (cache['offline']):
+                        raise FetchError(f'\tERROR: Failed to fetch resource "{name}" offline, it is not in the cache at {cache["dir"]}, leaving...')
+
+                    DownloadResource(name, url, file_path, md5, sha256, cancel_event)
+                    ExtractResource(name, file_path, wget_dir)
+                    Path(entry_dir).mkdir(parents=True, exist_ok=True)
+                    shutil.move(file_path, f'{cached_file}.tmp')
+                    os.replace(f'{cached_file}.tmp', cached_file)
+                    log(f'\tResource "{name}" downloaded to {wget_dir} and cached')
+
+            EvictCache(cache)
 
     except Exception as e:
-        ExitWithError(f'\tERROR: Failed to download resource "{name}" with error {e}, leaving...')
-    
-    
+        # Do not leave a partial download behind, it would block the next run
+        if (os.path.exists(wget_dir)):
+            shutil.rmtree(wget_dir, onexc=RemoveReadOnly)
+        if (isinstance(e, FetchError)):
+            raise
+        raise FetchError(f'\tERROR: Failed to download resource "{name}" with error {e}, leaving...')
 
-def RemoveEntry(base_dir, entry):
-    entry_dir = Path(os.path.abspath(base_dir + f'./{entry}')).as_posix()
-    
-    matches = glob.glob(entry_dir, include_hidden=True)
-    
-    for match in matches:
-        if (os.path.isfile(match)):
-            os.remove(match)
-            
-        if (os.path.isdir(match)):
-            shutil.rmtree(match)
-            
-    print(f'\tProcessed: {entry}')
-            
 
 
-        
-######################################################################################################################################################
-##  Main logic  ######################################################################################################################################
-######################################################################################################################################################
+def FetchBuffered(fetch_function, *fetch_args, cancel_event=None):
+    # Collect the log lines of the resource so that they can be printed as a single block once it is fetched
+    log_lines = []
 
+    if (cancel_event.is_set()):
+        raise FetchError(f'cancelled')
+    fetch_function(*fetch_args, log=log_lines.append, cancel_event=cancel_event)
 
+    return log_lines
 
-# Define argument parser
-parser = argparse.ArgumentParser(
-                    prog='File search and copy helper script.',
-                    description='Copies either a single file, or multiple files by search (either by extensions or glob query).')
-                         
-parser.add_argument('-f', '--file', action='store', required=True, help='File containing requirements packaged into JSON')                                        
 
-args = parser.parse_args()
 
+def FetchAll(git_repos, wget_resources, git_dir, wget_dir, git_jobs, wget_jobs, cache=None):
+    cancel_event = threading.Event()
+    errors = []
 
+    # Each kind of resource gets its own pool so that neither can starve the other
+    with ThreadPoolExecutor(max_workers=git_jobs) as git_executor, ThreadPoolExecutor(max_workers=wget_jobs) as wget_executor:
+        futures = dict()
+        for [name, repo, hash] in git_repos:
+            futures[git_executor.submit(FetchBuffered, FetchGitRepo, git_dir, name, repo, hash, cache, cancel_event=cancel_event)] = name
+        for [name, url, md5, sha256] in wget_resources:
+            futures[wget_executor.submit(FetchBuffered, FetchWgetResource, wget_dir, name, url, md5, sha256, cache, cancel_event=cancel_event)] = name
 
-# Checking arguments
-if (args.file is None) or (args.file == ''):
-    ExitWithError(f'\tERROR: specify --file (requirements JSON file), leaving...')
-else:
-    file_path = Path(os.path.abspath(args.file)).as_posix()
+        for future in as_completed(futures):
+            # Futures cancelled after the first failure never ran, only the failure itself is reported
+            if (future.cancelled()):
+                continue
 
-    with open(file_path, 'r') as file:
-        requirements_data = json.load(file)
+            try:
+                print('\n'.join(future.result()))
+            except FetchError as e:
+                if (f'{e}' != 'cancelled'):
+                    errors.append(f'{e}')
+            except Exception as e:
+                errors.append(f'\tERROR: Failed to fetch "{futures[future]}" with error {e}, leaving...')
 
+            # Stop everything still pending or running at the first failure
+            if (len(errors) > 0) and (cancel_event.is_set() == False):
+                cancel_event.set()
+                for pending_future in futures:
+                    pending_future.cancel()
 
-    
-# Checking external tools
-print('\n\rSCANNING FOR EXTERNAL TOOLS...')
-for tool in [{'executable':'git'}] +\
-            [{'executable':'cmake'}] +\
-            [{'executable':'gcovr'}] +\
-            [{'executable':'ninja'}] +\
-            [{'executable':'bsdtar'}] +\
-            [{'executable':'python3.11'}] +\
-            requirements_data['tools']:
-    executable      = tool['executable'] if 'executable' in tool else None
-    version_string  = tool['version_string'] if 'version_string' in tool else None
+    return errors
 
-    if (executable is None):
-        ExitWithError(f'\tERROR: The requirement file contains undefined executable, please ensure all executables provide the NAME field, leaving...')
 
-    CheckTool(executable, version_string)
 
+def FetchTarget(base_dir, name):
+    return Path(os.path.abspath(base_dir + f'./{name}')).as_posix()
 
 
-# Resetting local directories
-print('\n\rRESETTING LOCAL DIRECTORIES...')
-for reset in requirements_data['reset']:
-    ResetDirectory(f'./{reset['folder']}')
 
+def EntryUpToDate(state, key, spec):
+    entry = state['entries'].get(key)
+    return (entry is not None) and (entry['spec'] == spec)
 
 
-# Fetching GIT repositories
-print('\n\rFETCHING GIT DIRECTORIES...')
-for git_repo in requirements_data['git']:
-    name    = git_repo['name'] if 'name' in git_repo else None
-    repo    = git_repo['repo'] if 'repo' in git_repo else None
-    hash    = git_repo['hash'] if 'hash' in git_repo else None
 
-    if (name is None) or (repo is None):
-        ExitWithError(f'\tERROR: The requirement file contains GIT infos without name or repo fields, please ensure all GIT entries provide both NAME and REPO fields, leaving...')
+def OutputFingerprint(target_dir):
+    # Cheap check of a fetched output: every file below it with its relative path, size and modification time,
+    # the git metadata is left out as the checked out commit is verified separately
+    if (os.path.isdir(target_dir) == False):
+        return None
 
-    FetchGitRepo(f'./{requirements_data['git_dir']}', name, repo, hash)
+    fingerprint = hashlib.sha1()
+    for [dir_path, dir_names, file_names] in os.walk(target_dir):
+        dir_names[:] = sorted(dir_name for dir_name in dir_names if (dir_name != '.git'))
+        for file_name in sorted(file_name for file_name in file_names if (file_name != '.git')):
+            file_stat = os.stat(f'{dir_path}/{file_name}', follow_symlinks=False)
+            relative_path = Path(os.path.relpath(f'{dir_path}/{file_name}', target_dir)).as_posix()
+            fingerprint.update(f'{relative_path}|{file_stat.st_size}|{file_stat.st_mtime_ns}\n'.encode('utf-8'))
+        for dir_name in dir_names:
+            fingerprint.update(f'{Path(os.path.relpath(f"{dir_path}/{dir_name}", target_dir)).as_posix()}/\n'.encode('utf-8'))
 
+    return fingerprint.hexdigest()
 
 
-# Fetching WGET resources
-print('\n\rFETCHING WGET RESOURCES...')
-for wget_resource in requirements_data['wget']:
-    name    = wget_resource['name']   if 'name'   in wget_resource else None
-    url     = wget_resource['url']    if 'url'    in wget_resource else None
-    md5     = wget_resource['md5']    if 'md5'    in wget_resource else None
-    sha256  = wget_resource['sha256'] if 'sha256' in wget_resource else None
 
-    if (name is None) or (url is None):
-        ExitWithError(f'\tERROR: The requirement file contains WGET infos without name or url fields, please ensure all WGET entries provide both NAME and URL fields, leaving...')
-        
-    FetchWgetResource(f'./{requirements_data['wget_dir']}', name, url, md5, sha256)
+def GitHead(git_dir):
+    output = run_process('git', ['git', '-C', git_dir, 'rev-parse', 'HEAD'], capture_output=True, text=True)
+    return output.stdout.strip() if (output.returncode == 0) else None
+
+
+
+def RemoteHead(repo):
+    output = run_process('git', ['git', 'ls-remote', repo, 'HEAD'], capture_output=True, text=True)
+    return output.stdout.split()[0] if (output.returncode == 0) and (len(output.stdout.split()) > 0) else None
+
+
+
+def IsUnder(path, folders):
+    return any([(path == folder) or path.startswith(f'{folder}/') for folder in folders])
+
+
+
+def CompileDeletePatterns(base_dir, entries):
+    # Every pattern becomes its list of path components, grouped by the filesystem root it starts from
+    roots = dict()
+    for [index, entry] in enumerate(entries):
+        parts = Path(os.path.abspath(base_dir + f'./{entry}')).as_posix().split('/')
+        roots.setdefault(parts[0] + '/', []).append([index, parts[1:]])
+
+    return roots
+
+
+
+def FindDeleteMatches(roots):
+    matches = []
+
+    def Walk(dir_path, states):
+        # Literal components are looked up directly, the directory is only listed when a wildcard needs it
+        if (all(glob.has_magic(components[0]) == False for [_, components] in states)):
+            names = [components[0] for [_, components] in states if os.path.lexists(f'{dir_path}{components[0]}')]
+        else:
+            try:
+                names = os.listdir(dir_path)
+            except OSError:
+                return
+
+        for name in sorted(set(names)):
+            path = f'{dir_path}{name}'
+            matched_by = []
+            next_states = []
+            for [index, components] in states:
+                if (fnmatch.fnmatch(name, components[0])):
+                    if (len(components) == 1):
+                        matched_by.append(index)
+                    else:
+                        next_states.append([index, components[1:]])
+
+            # Matched paths are removed as a whole, there is no point in looking inside them
+            if (len(matched_by) > 0):
+                matches.append([path, matched_by])
+            elif (len(next_states) > 0) and (os.path.isdir(path)):
+                Walk(f'{path}/', next_states)
+
+    for [root, states] in roots.items():
+        Walk(root, states)
+
+    return matches
+
+
+
+def PathSize(path):
+    if (os.path.islink(path)) or (os.path.isdir(path) == False):
+        return os.lstat(path).st_size
+
+    size = 0
+    for [dir_path, dir_names, file_names] in os.walk(path):
+        for name in file_names + [name for name in dir_names if os.path.islink(f'{dir_path}/{name}')]:
+            try:
+                size += os.lstat(f'{dir_path}/{name}').st_size
+            except OSError:
+                pass
+    return size
+
+
+
+def ReapTrash(trash_dir):
+    # The trash is emptied by a detached process so that configure does not wait for large trees
+    reaper = 'import os, sys, stat, shutil\n' \
+             'def RemoveReadOnly(func, path, _):\n' \
+             '    os.chmod(path, stat.S_IWRITE)\n' \
+             '    func(path)\n' \
+             'shutil.rmtree(sys.argv[1], onexc=RemoveReadOnly)\n'
+    options = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP} if (os.name == 'nt') else {'start_new_session': True}
+
+    try:
+        subprocess.Popen([sys.executable, '-c', reaper, trash_dir], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **options)
+    except OSError:
+        shutil.rmtree(trash_dir, onexc=RemoveReadOnly)
+
+
+
+def RemoveEntries(base_dir, entries, jobs, dry_run=False):
+    trash_root = Path(os.path.abspath(base_dir + './.configure_trash')).as_posix()
+    matches = FindDeleteMatches(CompileDeletePatterns(base_dir, entries))
+    counts = [0] * len(entries)
+    for [_, matched_by] in matches:
+        for index in matched_by:
+            counts[index] += 1
+
+    if (dry_run):
+        total_size = 0
+        for [path, _] in matches:
+            size = PathSize(path)
+            total_size += size
+            print(f'\tWould remove: {path} ({size / (1024 * 1024):.2f} MB)')
+        print(f'\tWould remove {len(matches)} paths, {total_size / (1024 * 1024):.2f} MB in total')
+        return
+
+    # Directories are renamed into the trash, which only fails across filesystems, those are deleted concurrently instead
+    trash_dir = f'{trash_root}/{os.getpid()}-{time.time_ns()}'
+    trashed = 0
+    pending = []
+    for [path, _] in matches:
+        if (os.path.islink(path)) or (os.path.isdir(path) == False):
+            os.remove(path)
+            continue
+
+        try:
+            Path(trash_dir).mkdir(parents=True, exist_ok=True)
+            os.rename(path, f'{trash_dir}/{trashed}')
+            trashed += 1
+        except OSError:
+            pending.append(path)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(lambda path: shutil.rmtree(path, onexc=RemoveReadOnly), pending))
+
+    # Leftovers of interrupted reapers are picked up as well, they are gathered under a single reaper
+    leftovers = [path for path in glob.glob(f'{glob.escape(trash_root)}-*') if (os.path.isdir(path))]
+    if ((os.path.isdir(trash_root)) and (len(os.listdir(trash_root)) > 0)) or (len(leftovers) > 0):
+        reap_dir = f'{trash_root}-{os.getpid()}-{time.time_ns()}'
+        if (os.path.isdir(trash_root)):
+            os.rename(trash_root, reap_dir)
+        else:
+            Path(reap_dir).mkdir(parents=True, exist_ok=True)
+        for leftover in leftovers:
+            try:
+                os.rename(leftover, f'{reap_dir}/{os.path.basename(leftover)}')
+            except OSError:
+                pass
+        ReapTrash(reap_dir)
+
+    for [index, entry] in enumerate(entries):
+        print(f'\tProcessed: {entry} ({counts[index]} matches)')
 
 
 
-# Removing entries
-print('\n\rREMOVING ENTRIES...')
-for entry in requirements_data['delete']:
-    if (entry == ""):
-        ExitWithError(f'\tERROR: The requirement file contains empty DELETE entries, leaving...')
         
-    RemoveEntry('./', entry)
\ No newline at end of file
+######################################################################################################################################################
+##  Main logic  ######################################################################################################################################
+######################################################################################################################################################
+
+
+
+def Main(argv=None, state=None):
+    # Every stage can be run in-process, the state carries indexes and caches from one stage to the next
+    state = state if (state is not None) else dict()
+
+    # Define argument parser
+    parser = argparse.ArgumentParser(
+                        prog='File search and copy helper script.',
+                        description='Copies either a single file, or multiple files by search (either by extensions or glob query).')
+
+    parser.add_argument('-f', '--file',     action='store',      required=True,  help='File containing requirements packaged into JSON')
+    parser.add_argument('--git_jobs',       action='store',      required=False, type=int, default=4, help='Number of GIT repositories cloned concurrently')
+    parser.add_argument('--wget_jobs',      action='store',      required=False, type=int, default=4, help='Number of WGET resources downloaded concurrently')
+    parser.add_argument('--cache_dir',      action='store',      required=False, default=os.environ.get('PROJECT_TEMPLATE_CACHE', f'{Path.home().as_posix()}/.cache/project_template'), help='Local cache of the downloaded resources and repository mirrors shared between runs')
+    parser.add_argument('--cache_size',     action='store',      required=False, type=int, default=10240, help='Size limit of the resource cache in MB, least recently used entries are evicted first')
+    parser.add_argument('--offline',        action='store_true', required=False, help='Only use the cache, fail on the first resource or commit missing from it')
+    parser.add_argument('--tool_jobs',      action='store',      required=False, type=int, default=8, help='Number of external tools probed concurrently')
+    parser.add_argument('--tool_timeout',   action='store',      required=False, type=float, default=30, help='Time in seconds after which a tool probe is considered failed')
+    parser.add_argument('--delete_jobs',    action='store',      required=False, type=int, default=4, help='Number of directories deleted concurrently when they cannot be moved to the trash')
+    parser.add_argument('--delete_dry_run', action='store_true', required=False, help='Only print the paths matched by the DELETE entries and their size')
+    parser.add_argument('--trace',          action='store',      required=False, default=os.environ.get(TRACE_ENVIRONMENT), help='Write a Chrome trace of the timed steps to this file and print a summary table at the end')
+    parser.add_argument('--run_report',     action='store',      required=False, default=os.environ.get(REPORT_ENVIRONMENT), help='Append the wall time, CPU time, peak memory and I/O of every child process to this JSON report and print a summary per step')
+    parser.add_argument('--time_limit',     action='store',      required=False, help='Time limit in seconds of every child process, or comma-separated step=seconds pairs (git, tool_probe), exceeding children are stopped')
+    parser.add_argument('--memory_limit',   action='store',      required=False, help='Address space limit in MB of every child process, or comma-separated step=MB pairs (Linux only)')
+    parser.add_argument('--state_file',     action='store',      required=False, default='./.configure_state.json', help='State of the previous configure, used to only redo the entries that changed')
+    parser.add_argument('--force',          action='store_true', required=False, help='Ignore the state of the previous configure and redo every entry')
+    parser.add_argument('--no_cache',       action='store_true', required=False, help='Always download the resources and clone the repositories without using the cache')
+
+    args = parser.parse_args(argv)
+    enable_tracing(args.trace)
+    enable_run_report(args.run_report, 'configure', args.time_limit, args.memory_limit)
+
+
+
+    # Checking arguments
+    if (args.file is None) or (args.file == ''):
+        ExitWithError(f'\tERROR: specify --file (requirements JSON file), leaving...')
+    else:
+        file_path = Path(os.path.abspath(args.file)).as_posix()
+
+        with open(file_path, 'r') as file:
+            requirements_data = json.load(file)
+
+
+
+    # Checking external tools
+    print('\n\rSCANNING FOR EXTERNAL TOOLS...')
+    tools = []
+    for tool in [{'executable':'git'}] +\
+                [{'executable':'cmake'}] +\
+                [{'executable':'gcovr'}] +\
+                [{'executable':'ninja'}] +\
+                [{'executable':'bsdtar'}] +\
+                [{'executable':'python3.11'}] +\
+                requirements_data['tools']:
+        executable      = tool['executable'] if 'executable' in tool else None
+        version_string  = tool['version_string'] if 'version_string' in tool else None
+
+        if (executable is None):
+            ExitWithError(f'\tERROR: The requirement file contains undefined executable, please ensure all executables provide the NAME field, leaving...')
+
+        tools.append([executable, version_string])
+
+    tool_errors = CheckTools(tools, args.tool_jobs, args.tool_timeout, Path(os.path.abspath(args.cache_dir)).as_posix() if (args.no_cache == False) else None, state)
+    if (len(tool_errors) > 0):
+        ExitWithError('\n'.join(tool_errors))
+
+
+
+    # Loading the state of the previous configure, entries that did not change and are still intact are left in place
+    state_file = Path(os.path.abspath(args.state_file)).as_posix()
+    previous_state = load_json_file(state_file, {'entries': dict()}) if (args.force == False) else {'entries': dict()}
+    new_state = {'entries': dict()}
+
+
+    # Resetting local directories
+    print('\n\rRESETTING LOCAL DIRECTORIES...')
+    reset_folders = []
+    for reset in requirements_data['reset']:
+        folder_path = Path(os.path.abspath(f'./{reset['folder']}')).as_posix()
+
+        if (EntryUpToDate(previous_state, f'reset:{reset['folder']}', reset)) and (os.path.isdir(folder_path)):
+            print(f'\t{folder_path} - up to date')
+        else:
+            ResetDirectory(f'./{reset['folder']}')
+            reset_folders.append(folder_path)
+
+        new_state['entries'][f'reset:{reset['folder']}'] = {'spec': reset}
+
+
+
+    # Fetching GIT repositories and WGET resources
+    print('\n\rFETCHING GIT DIRECTORIES AND WGET RESOURCES...')
+    git_dir  = f'./{requirements_data['git_dir']}'
+    wget_dir = f'./{requirements_data['wget_dir']}'
+
+    git_repos = []
+    for git_repo in requirements_data['git']:
+        name    = git_repo['name'] if 'name' in git_repo else None
+        repo    = git_repo['repo'] if 'repo' in git_repo else None
+        hash    = git_repo['hash'] if 'hash' in git_repo else None
+
+        if (name is None) or (repo is None):
+            ExitWithError(f'\tERROR: The requirement file contains GIT infos without name or repo fields, please ensure all GIT entries provide both NAME and REPO fields, leaving...')
+
+        # Unpinned repositories follow their remote, they are only up to date while the remote did not move
+        target = FetchTarget(git_dir, name)
+        spec = {'repo': repo, 'hash': hash, 'git_dir': requirements_data['git_dir']}
+        entry = previous_state['entries'].get(f'git:{name}')
+        if (EntryUpToDate(previous_state, f'git:{name}', spec)) and (IsUnder(target, reset_folders) == False) and\
+           (entry['fingerprint'] == OutputFingerprint(target)) and (entry['resolved'] == GitHead(target)) and\
+           ((hash is not None) or (args.offline) or (entry['resolved'] == RemoteHead(repo))):
+            print(f'\tRepo "{name}" up to date')
+            new_state['entries'][f'git:{name}'] = entry
+            continue
+
+        if (os.path.exists(target)):
+            shutil.rmtree(target, onexc=RemoveReadOnly)
+        git_repos.append([name, repo, hash])
+        new_state['entries'][f'git:{name}'] = {'spec': spec, 'target': target}
+
+    wget_resources = []
+    for wget_resource in requirements_data['wget']:
+        name    = wget_resource['name']   if 'name'   in wget_resource else None
+        url     = wget_resource['url']    if 'url'    in wget_resource else None
+        md5     = wget_resource['md5']    if 'md5'    in wget_resource else None
+        sha256  = wget_resource['sha256'] if 'sha256' in wget_resource else None
+
+        if (name is None) or (url is None):
+            ExitWithError(f'\tERROR: The requirement file contains WGET infos without name or url fields, please ensure all WGET entries provide both NAME and URL fields, leaving...')
+
+        target = FetchTarget(wget_dir, name)
+        spec = {'url': url, 'md5': md5, 'sha256': sha256, 'wget_dir': requirements_data['wget_dir']}
+        entry = previous_state['entries'].get(f'wget:{name}')
+        if (EntryUpToDate(previous_state, f'wget:{name}', spec)) and (IsUnder(target, reset_folders) == False) and (entry['fingerprint'] == OutputFingerprint(target)):
+            print(f'\tResource "{name}" up to date')
+            new_state['entries'][f'wget:{name}'] = entry
+            continue
+
+        if (os.path.exists(target)):
+            shutil.rmtree(target, onexc=RemoveReadOnly)
+        wget_resources.append([name, url, md5, sha256])
+        new_state['entries'][f'wget:{name}'] = {'spec': spec, 'target': target}
+
+    # Outputs of the entries dropped from the requirements go away too
+    for [key, entry] in previous_state['entries'].items():
+        if (key not in new_state['entries']) and ('target' in entry) and (os.path.exists(entry['target'])) and (IsUnder(entry['target'], reset_folders) == False):
+            shutil.rmtree(entry['target'], onexc=RemoveReadOnly)
+            print(f'\tRemoved: {entry['target']}')
+
+    cache = None
+    if (args.no_cache == False):
+        cache = {'dir':        Path(os.path.abspath(args.cache_dir)).as_posix(),
+                 'size_limit': args.cache_size * 1024 * 1024,
+                 'offline':    args.offline}
+    elif (args.offline):
+        ExitWithError(f'\tERROR: --offline requires the resource cache, leaving...')
+
+    fetch_errors = FetchAll(git_repos, wget_resources, git_dir, wget_dir, args.git_jobs, args.wget_jobs, cache)
+
+    # Record what was fetched, failed entries are left out so that the next run retries them
+    for [key, entry] in list(new_state['entries'].items()):
+        if ('fingerprint' in entry) or ('target' not in entry):
+            continue
+        if (os.path.isdir(entry['target']) == False):
+            del new_state['entries'][key]
+            continue
+        if (key.startswith('git:')):
+            entry['resolved'] = GitHead(entry['target'])
+        entry['fingerprint'] = OutputFingerprint(entry['target'])
+
+    if (len(fetch_errors) > 0):
+        save_json_file(state_file, new_state)
+        ExitWithError('\n'.join(fetch_errors))
+
+
+
+    # Removing entries, only needed when something was fetched again or the list changed
+    print('\n\rREMOVING ENTRIES...')
+    for entry in requirements_data['delete']:
+        if (entry == ""):
+            ExitWithError(f'\tERROR: The requirement file contains empty DELETE entries, leaving...')
+
+    if (args.delete_dry_run):
+        RemoveEntries('./', requirements_data['delete'], args.delete_jobs, dry_run=True)
+    elif (len(reset_folders) + len(git_repos) + len(wget_resources) == 0) and (EntryUpToDate(previous_state, 'delete', requirements_data['delete'])):
+        print(f'\tUp to date')
+    else:
+        RemoveEntries('./', requirements_data['delete'], args.delete_jobs)
+
+        # Entries fetched before the removal must be fingerprinted again
+        for entry in new_state['entries'].values():
+            if ('target' in entry):
+                entry['fingerprint'] = OutputFingerprint(entry['target'])
+
+    # A dry run leaves the removal pending for the next configure
+    if (args.delete_dry_run == False):
+        new_state['entries']['delete'] = {'spec': requirements_data['delete']}
+
+    save_json_file(state_file, new_state)
+
+    return 0
+
+
+
+if (__name__ == '__main__'):
+    sys.exit(Main())
@@ -0,0 +1,366 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+import os
+import sys
+import time
+import atexit
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .json_files import load_json_file, save_json_file
+except ImportError:
+    from json_files import load_json_file, save_json_file
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+######################################################################################################################################################
+##  Helper methods  ##################################################################################################################################
+######################################################################################################################################################
+
+
+
+# None while no report is requested, the child processes are then waited for exactly like by subprocess
+REPORT = None
+REPORT_ENVIRONMENT = 'PROJECT_TEMPLATE_RUN_REPORT'
+REPORT_RUNS = 50
+
+# The usage of a child is only available to the one reaping it, which needs wait4 and a peek at the exited child (POSIX)
+ACCOUNTING = hasattr(os, 'wait4') and hasattr(os, 'waitid') and hasattr(os, 'WNOWAIT')
+
+# The util-linux wrapper sets the memory limit of a child before it executes the command, without running Python in the forked child
+PRLIMIT_TOOL = shutil.which('prlimit') if (sys.platform.startswith('linux')) else None
+
+
+
+def parse_limits(value, scale=1):
+    # Either a single limit for every child, or comma-separated step=limit pairs, "*" standing for the remaining steps
+    limits = dict()
+    for item in [item.strip() for item in (value or '').split(',') if (item.strip() != '')]:
+        [step, limit] = item.split('=', 1) if ('=' in item) else ['*', item]
+        try:
+            limits[step.strip()] = float(limit) * scale
+        except ValueError:
+            raise SystemExit(f'ERROR: invalid limit "{item}", expected a number or step=number, leaving...')
+
+    return limits
+
+
+
+def read_process_io(pid):
+    # An exited child that was not reaped yet still holds its I/O counters, including the ones of its own reaped children
+    try:
+        with open(f'/proc/{pid}/io', 'r') as file:
+            counters = dict(line.split(':', 1) for line in file.read().splitlines() if (':' in line))
+        return {'read_bytes':  int(counters['read_bytes']),
+                'write_bytes': int(counters['write_bytes']),
+                'read_chars':  int(counters['rchar']),
+                'write_chars': int(counters['wchar'])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+
+class RunReport:
+    def __init__(self, report_file, name, time_limits, memory_limits):
+        self.report_file = Path(os.path.abspath(report_file)).as_posix() if (report_file is not None) else None
+        self.name = name
+        self.limits = {'time': time_limits, 'memory': memory_limits}
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.processes = []
+        self.unapplied = set()
+        self.lock = threading.Lock()
+
+    def limit(self, kind, step):
+        return self.limits[kind].get(step, self.limits[kind].get('*'))
+
+    def record(self, process, wall, usage, io):
+        command = [str(arg) for arg in ([process.command] if (isinstance(process.command, (str, bytes, os.PathLike))) else process.command)]
+        entry = {'step':           process.step,
+                 'label':          process.label,
+                 'command':        ' '.join(command[:6] + (['...'] if (len(command) > 6) else [])),
+                 'pid':            process.pid,
+                 'start':          round(process.start - self.start, 6),
+                 'wall':           round(wall, 6),
+                 'user':           None,
+                 'sys':            None,
+                 'max_rss':        None,
+                 'read_bytes':     None,
+                 'write_bytes':    None,
+                 'read_chars':     None,
+                 'write_chars':    None,
+                 'returncode':     process.returncode,
+                 'limit_exceeded': process.limit_exceeded,
+                 'time_limit':     self.limit('time', process.step),
+                 'memory_limit':   process.memory_limit,
+                 'memory_applied': process.memory_applied}
+
+        if (usage is not None):
+            # ru_maxrss is reported in kilobytes, except on macOS where it already is in bytes, and it includes the size of the forking
+            # interpreter before the exec, so only children growing past it show their own peak
+            entry.update({'user':        round(usage.ru_utime, 6),
+                          'sys':         round(usage.ru_stime, 6),
+                          'max_rss':     usage.ru_maxrss * (1 if (sys.platform == 'darwin') else 1024),
+                          'read_bytes':  usage.ru_inblock * 512,
+                          'write_bytes': usage.ru_oublock * 512})
+        if (io is not None):
+            entry.update(io)
+
+        with self.lock:
+            self.processes.append(entry)
+
+    def steps(self):
+        steps = dict()
+        for entry in self.processes:
+            step = steps.setdefault(entry['step'], {'calls': 0, 'failed': 0, 'wall': 0.0, 'max_wall': 0.0, 'cpu': 0.0, 'max_rss': 0, 'read_bytes': 0, 'write_bytes': 0})
+            step['calls'] += 1
+            step['failed'] += 1 if (entry['returncode'] != 0) else 0
+            step['wall'] += entry['wall']
+            step['max_wall'] = max(step['max_wall'], entry['wall'])
+            step['cpu'] += (entry['user'] or 0) + (entry['sys'] or 0)
+            step['max_rss'] = max(step['max_rss'], entry['max_rss'] or 0)
+            step['read_bytes'] += entry['read_bytes'] or 0
+            step['write_bytes'] += entry['write_bytes'] or 0
+
+        return steps
+
+    def write(self):
+        run = {'name':      self.name,
+               'argv':      sys.argv,
+               'started':   time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+               'wall':      round(time.perf_counter() - self.start, 6),
+               'accounted': ACCOUNTING,
+               'steps':     self.steps(),
+               'processes': self.processes}
+
+        # Every script of a build appends its run to the same report, only the latest runs are kept
+        report = load_json_file(self.report_file, dict())
+        runs = report.get('runs', []) if (isinstance(report, dict)) else []
+        runs = runs[-(REPORT_RUNS - 1):] + [run]
+
+        save_json_file(self.report_file, {'version': 1, 'runs': runs})
+
+    def summary(self):
+        lines = [f'{"step":<20} {"calls":>7} {"failed":>7} {"wall s":>10} {"max wall s":>11} {"cpu s":>10} {"max rss MB":>11} {"read MB":>10} {"write MB":>10}']
+        for [name, step] in sorted(self.steps().items(), key=lambda item: item[1]['wall'], reverse=True):
+            lines.append(f'{name:<20} {step["calls"]:>7} {step["failed"]:>7} {step["wall"]:>10.2f} {step["max_wall"]:>11.2f} {step["cpu"]:>10.2f} '
+                         f'{step["max_rss"] / 1048576:>11.1f} {step["read_bytes"] / 1048576:>10.1f} {step["write_bytes"] / 1048576:>10.1f}')
+        return lines
+
+
+
+def enable_run_report(report_file, name, time_limit=None, memory_limit=None):
+    # Limits are enforced even without a report file, the usage of the children is then only kept for this run
+    global REPORT
+    time_limits = parse_limits(time_limit)
+    memory_limits = parse_limits(memory_limit, 1048576)
+    if ((report_file is None) or (report_file == '')) and (len(time_limits) == 0) and (len(memory_limits) == 0):
+        return
+    if (REPORT is not None):
+        return
+
+    REPORT = RunReport(report_file if (report_file != '') else None, name, time_limits, memory_limits)
+    atexit.register(finish_run_report)
+
+
+
+def finish_run_report():
+    global REPORT
+    if (REPORT is None):
+        return
+
+    [report, REPORT] = [REPORT, None]
+    if (report.report_file is None):
+        return
+    report.write()
+
+    print(f'RESOURCES: {len(report.processes)} child processes written to {report.report_file}')
+    for line in report.summary():
+        print(f'RESOURCES: {line}')
+
+
+
+class AccountedProcess(subprocess.Popen):
+    # Drop-in for subprocess.Popen which reaps the child itself to keep its resource usage for the run report
+    def __init__(self, step, args, label=None, **kwargs):
+        self.step = step
+        self.label = label
+        self.report = REPORT
+        self.limit_exceeded = None
+        self.watchdog = None
+        self.recorded = False
+        self.wait_lock = threading.Lock()
+        self.command = args
+        self.memory_limit = None
+        self.memory_applied = None
+
+        # The limit is set before the command is executed where the wrapper is available, and inherited by everything the child starts itself
+        memory_limit = self.report.limit('memory', step) if (self.report is not None) else None
+        if (memory_limit is not None):
+            args = self.wrap_memory_limit(int(memory_limit), args, kwargs)
+
+        self.start = time.perf_counter()
+        super().__init__(args, **kwargs)
+
+        if (self.report is None):
+            return
+
+        # Otherwise it is only set once the child runs, whatever it allocated before escapes the limit
+        if (self.memory_limit is not None) and (self.memory_applied is None):
+            try:
+                resource.prlimit(self.pid, resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+                self.memory_applied = 'after_start'
+            except (OSError, ValueError) as e:
+                self.unapplied_memory_limit(self.memory_limit, f'{e}')
+                self.memory_limit = None
+
+        time_limit = self.report.limit('time', step)
+        if (time_limit is not None):
+            self.watchdog = threading.Timer(time_limit, self.expire, [time_limit])
+            self.watchdog.daemon = True
+            self.watchdog.start()
+
+    def wrap_memory_limit(self, memory_limit, args, kwargs):
+        if (resource is None) or (hasattr(resource, 'prlimit') == False):
+            self.unapplied_memory_limit(memory_limit, 'address space limits are not supported on this platform')
+            return args
+
+        # Only a privileged process may raise its hard limit, a limit above it cannot be set
+        hard_limit = resource.getrlimit(resource.RLIMIT_AS)[1]
+        if (hard_limit != resource.RLIM_INFINITY) and (memory_limit > hard_limit):
+            self.unapplied_memory_limit(memory_limit, f'the hard limit is {hard_limit / 1048576:g} MB')
+            return args
+
+        self.memory_limit = memory_limit
+
+        # Shell commands and commands that cannot be found (left to fail in Popen as without the wrapper) are limited after the start
+        environment = kwargs.get('env') if (kwargs.get('env') is not None) else os.environ
+        if (PRLIMIT_TOOL is None) or (kwargs.get('shell')) or (kwargs.get('executable') is not None) or (isinstance(args, (str, bytes, os.PathLike))):
+            return args
+        if (shutil.which(str(args[0]), path=environment.get('PATH', os.defpath)) is None):
+            return args
+
+        self.memory_applied = 'before_exec'
+        return [PRLIMIT_TOOL, f'--as={memory_limit}:{memory_limit}', '--'] + list(args)
+
+    def unapplied_memory_limit(self, memory_limit, reason):
+        with self.report.lock:
+            reported = self.step in self.report.unapplied
+            self.report.unapplied.add(self.step)
+        if (reported == False):
+            print(f'...... {self.step} memory limit of {memory_limit / 1048576:g} MB could not be applied, {reason} ...')
+
+    def expire(self, time_limit):
+        if (self.poll() is None):
+            self.limit_exceeded = 'time'
+            print(f'...... {self.step} exceeded the time limit of {time_limit:g} s and is stopped ...')
+            self.kill()
+
+    def poll(self):
+        if (self.report is None) or (self.returncode is not None):
+            return super().poll()
+
+        if (ACCOUNTING == False):
+            # Only the wall time is known where an exited child cannot be looked at before reaping it
+            if (super().poll() is not None):
+                self.finish(None, None)
+            return self.returncode
+
+        try:
+            exited = os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+        except ChildProcessError:
+            return super().poll()
+        return self.wait() if (exited is not None) else None
+
+    def wait(self, timeout=None):
+        if (self.report is None) or (self.returncode is not None):
+            return super().wait(timeout)
+
+        if (ACCOUNTING == False):
+            super().wait(timeout)
+            self.finish(None, None)
+            return self.returncode
+
+        # Wait without reaping, so that the counters of the exited child can still be read, then reap it with its usage
+        end = (time.monotonic() + timeout) if (timeout is not None) else None
+        if (self.wait_lock.acquire(timeout=(max(0, end - time.monotonic()) if (end is not None) else -1)) == False):
+            raise subprocess.TimeoutExpired(self.command, timeout)
+
+        delay = 0.0005
+        try:
+            while (self.returncode is None):
+                try:
+                    exited = os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT | (os.WNOHANG if (end is not None) else 0))
+                except ChildProcessError:
+                    return super().wait(timeout)
+
+                if (exited is None):
+                    if (time.monotonic() >= end):
+                        raise subprocess.TimeoutExpired(self.command, timeout)
+                    time.sleep(min(delay, max(0, end - time.monotonic())))
+                    delay = min(delay * 2, 0.05)
+                    continue
+
+                io = read_process_io(self.pid)
+                try:
+                    [pid, status, usage] = os.wait4(self.pid, 0)
+                    self.returncode = os.waitstatus_to_exitcode(status)
+                except ChildProcessError:
+                    # Reaped behind our back, the usage is lost like the exit status
+                    [usage, self.returncode] = [None, 0]
+                self.finish(usage, io)
+        finally:
+            self.wait_lock.release()
+
+        return self.returncode
+
+    def finish(self, usage, io):
+        wall = time.perf_counter() - self.start
+        if (self.watchdog is not None):
+            self.watchdog.cancel()
+
+        with self.report.lock:
+            if (self.recorded):
+                return
+            self.recorded = True
+        self.report.record(self, wall, usage, io)
+
+
+
+def run_process(step, command, label=None, input=None, timeout=None, capture_output=False, **kwargs):
+    # Same as subprocess.run, with the child accounted under the given step of the run report
+    if (capture_output):
+        kwargs['stdout'] = subprocess.PIPE
+        kwargs['stderr'] = subprocess.PIPE
+    if (input is not None):
+        kwargs['stdin'] = subprocess.PIPE
+
+    with AccountedProcess(step, command, label=label, **kwargs) as process:
+        try:
+            [stdout, stderr] = process.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise
+        except:
+            process.kill()
+            raise
+
+    return subprocess.CompletedProcess(process.command, process.returncode, stdout, stderr)
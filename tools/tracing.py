@@ -0,0 +1,149 @@
+######################################################################################################################################################
+##
+##    This script was originally produced for the GitHub repo provided below under the "Do WHat You Want With It" license.
+##
+##    Repo: https://github.com/viksmir/project_template
+##
+######################################################################################################################################################
+
+
+
+import os
+import time
+import atexit
+import threading
+import functools
+from pathlib import Path
+
+# Sibling modules are imported relative to the package, or from the script directory when run as a script
+try:
+    from .json_files import save_json_file
+except ImportError:
+    from json_files import save_json_file
+
+
+
+######################################################################################################################################################
+##  Helper methods  ##################################################################################################################################
+######################################################################################################################################################
+
+
+
+# None while tracing is disabled, every hook below returns after this single check
+TRACER = None
+TRACE_ENVIRONMENT = 'PROJECT_TEMPLATE_TRACE'
+
+
+
+class Tracer:
+    def __init__(self, trace_file):
+        self.trace_file = Path(os.path.abspath(trace_file)).as_posix()
+        self.start = time.perf_counter_ns()
+        self.events = []
+        self.threads = dict()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def thread_id(self):
+        # Chrome trace viewers group by small thread numbers, named after the Python threads
+        ident = threading.get_ident()
+        if (ident not in self.threads):
+            with self.lock:
+                self.threads.setdefault(ident, [len(self.threads) + 1, threading.current_thread().name])
+        return self.threads[ident][0]
+
+    def stack(self):
+        if (hasattr(self.local, 'stack') == False):
+            self.local.stack = []
+        return self.local.stack
+
+    def record(self, name, start, end, counters):
+        event = {'name': name, 'cat': 'tools', 'ph': 'X', 'pid': os.getpid(), 'tid': self.thread_id(),
+                 'ts': (start - self.start) / 1000, 'dur': (end - start) / 1000, 'args': counters}
+        with self.lock:
+            self.events.append(event)
+
+    def write(self):
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': thread_name}} for [tid, thread_name] in self.threads.values()]
+
+        save_json_file(self.trace_file, {'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, indent=None)
+
+    def summary(self):
+        totals = dict()
+        for event in self.events:
+            entry = totals.setdefault(event['name'], {'calls': 0, 'total': 0.0, 'max': 0.0, 'files': 0, 'bytes': 0})
+            entry['calls'] += 1
+            entry['total'] += event['dur'] / 1000
+            entry['max'] = max(entry['max'], event['dur'] / 1000)
+            entry['files'] += event['args'].get('files', 0)
+            entry['bytes'] += event['args'].get('bytes', 0)
+
+        lines = [f'{"span":<32} {"calls":>7} {"total ms":>12} {"max ms":>12} {"files":>9} {"bytes":>14}']
+        for [name, entry] in sorted(totals.items(), key=lambda item: item[1]['total'], reverse=True):
+            lines.append(f'{name:<32} {entry["calls"]:>7} {entry["total"]:>12.1f} {entry["max"]:>12.1f} {entry["files"]:>9} {entry["bytes"]:>14}')
+        return lines
+
+
+
+def enable_tracing(trace_file):
+    # Spans are collected until the run ends, then written once as a Chrome trace (chrome://tracing, ui.perfetto.dev)
+    global TRACER
+    if (trace_file is None) or (trace_file == '') or (TRACER is not None):
+        return
+
+    TRACER = Tracer(trace_file)
+    atexit.register(finish_tracing)
+
+
+
+def finish_tracing():
+    global TRACER
+    if (TRACER is None):
+        return
+
+    [tracer, TRACER] = [TRACER, None]
+    tracer.write()
+
+    print(f'TRACE: {len(tracer.events)} spans written to {tracer.trace_file}')
+    for line in tracer.summary():
+        print(f'TRACE: {line}')
+
+
+
+def traced(name, *label_arguments):
+    # The named arguments of the call become span arguments, so that repeated spans (per project, per resource) can be told apart
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            tracer = TRACER
+            if (tracer is None):
+                return function(*args, **kwargs)
+
+            counters = dict()
+            if (len(label_arguments) > 0):
+                bound = dict(zip(function.__code__.co_varnames, args), **kwargs)
+                counters.update({argument: str(bound[argument]) for argument in label_arguments if (argument in bound)})
+
+            stack = tracer.stack()
+            stack.append(counters)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = time.perf_counter_ns()
+                stack.pop()
+                tracer.record(name, start, end, counters)
+        return wrapper
+    return decorator
+
+
+
+def trace_counters(**counters):
+    # Adds to the innermost span of the calling thread, the byte and file counts end up in the summary table
+    tracer = TRACER
+    if (tracer is None) or (len(tracer.stack()) == 0):
+        return
+
+    span = tracer.stack()[-1]
+    for [key, value] in counters.items():
+        span[key] = span.get(key, 0) + value